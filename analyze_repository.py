@@ -0,0 +1,306 @@
+# system imports
+import argparse
+import json
+import os
+
+# local imports
+from devtools import output
+from devtools.change_impact import affected_test_directories, ctest_regex, \
+                                    read_changed_files
+from devtools.compiler_cache import CacheStatsLog
+from devtools.header_costs import header_costs, format_table
+from devtools.include_graph import IncludeGraph
+from devtools.njoy_source_tree import NJOYSourceTree
+from devtools.time_trace import TimeTraceReport, format_report
+
+
+def main():
+
+    # parse input arguments
+    args = process_input()
+
+    # run the analysis
+    args.command(args)
+
+
+def process_input():
+    """ Use argparse for command line input processing.
+
+    """
+
+    parser = argparse.ArgumentParser(
+        description='Analyze a repository in the NJOY framework.'
+        )
+    subparsers = parser.add_subparsers(title='commands')
+
+    # affected test directories
+    affected = subparsers.add_parser(
+        'affected',
+        help='list the test directories affected by changed files'
+        )
+    add_common_arguments(affected)
+    add_graph_arguments(affected)
+    affected.add_argument(
+        '--changed-files', '-c',
+        type=str,
+        help='file listing the changed files relative to path, as given '
+             'by git diff --name-only --relative ("-" for stdin)',
+        default='-'
+        )
+    affected.add_argument(
+        '--format', '-f',
+        type=str,
+        choices=('list', 'ctest'),
+        help='print the affected test directories, or a regular '
+             'expression selecting their tests for ctest -R',
+        default='list'
+        )
+    affected.add_argument(
+        '--ignore',
+        type=str,
+        nargs='*',
+        help='glob patterns of changed files that affect no test',
+        default=['*.md']
+        )
+    affected.set_defaults(command=affected_command)
+
+    # header costs
+    headers = subparsers.add_parser(
+        'headers',
+        help='report the estimated compile-time cost of every header'
+        )
+    add_common_arguments(headers)
+    add_graph_arguments(headers)
+    headers.add_argument(
+        '--top', '-t',
+        type=int,
+        help='number of headers in the printed table (0 for none)',
+        default=20
+        )
+    headers.add_argument(
+        '--json',
+        type=str,
+        help='file to write the full report to, as JSON',
+        default=None
+        )
+    headers.set_defaults(command=headers_command)
+
+    # time traces
+    time_trace = subparsers.add_parser(
+        'time-trace',
+        help='aggregate the clang -ftime-trace profiles of a build'
+        )
+    add_common_arguments(time_trace)
+    time_trace.add_argument(
+        '--build-dir', '-b',
+        type=str,
+        help='build directory (relative to path)',
+        default='bin'
+        )
+    time_trace.add_argument(
+        '--top', '-t',
+        type=int,
+        help='number of entries in the printed tables (0 for none)',
+        default=20
+        )
+    time_trace.add_argument(
+        '--json',
+        type=str,
+        help='file to write the full report to, as JSON',
+        default=None
+        )
+    time_trace.set_defaults(command=time_trace_command)
+
+    # compiler cache statistics
+    cache_stats = subparsers.add_parser(
+        'cache-stats',
+        help='report the compiler cache hit rate of every module'
+        )
+    cache_stats.add_argument(
+        'path',
+        type=str,
+        help='path to repository'
+        )
+    cache_stats.add_argument(
+        '--name', '-n',
+        type=str,
+        help='repository name',
+        default=None
+        )
+    cache_stats.add_argument(
+        '--build-dir', '-b',
+        type=str,
+        help='build directory (relative to path)',
+        default='bin'
+        )
+    cache_stats.add_argument(
+        '--reset',
+        action='store_true',
+        help='clear the statistics log after reporting, so that the next '
+             'report only covers the next build',
+        default=False
+        )
+    cache_stats.set_defaults(command=cache_stats_command)
+
+    # parse and check
+    args = parser.parse_args()
+    if not hasattr(args, 'command'):
+        parser.error('a command is required')
+
+    return args
+
+
+def add_common_arguments(parser):
+    """ Add the arguments shared by all commands.
+
+    """
+
+    parser.add_argument(
+        'path',
+        type=str,
+        help='path to repository'
+        )
+    parser.add_argument(
+        '--source-manifest',
+        type=str,
+        help='file caching the source tree scan (relative to path)',
+        default=None
+        )
+
+
+def add_graph_arguments(parser):
+    """ Add the arguments of the commands using the include graph.
+
+    """
+
+    parser.add_argument(
+        '--include-graph-cache',
+        type=str,
+        help='file caching the include directives of the sources '
+             '(relative to path)',
+        default=os.path.join('bin', 'include_graph.json')
+        )
+    parser.add_argument(
+        '--no-include-graph-cache',
+        action='store_const',
+        const=None,
+        dest='include_graph_cache',
+        help='parse every source again'
+        )
+
+
+def make_include_graph(args):
+    """ Scan the source tree and build its include graph.
+
+    """
+
+    manifest = None
+    if args.source_manifest:
+        manifest = os.path.join(args.path, args.source_manifest)
+
+    cache = None
+    if args.include_graph_cache:
+        cache = os.path.join(args.path, args.include_graph_cache)
+
+    return IncludeGraph(NJOYSourceTree(args.path, manifest), cache)
+
+
+def affected_command(args):
+    """ Print the test directories affected by the changed files.
+
+    """
+
+    directories = affected_test_directories(
+        make_include_graph(args),
+        read_changed_files(args.changed_files),
+        args.ignore
+        )
+
+    if args.format == 'ctest':
+        # an empty expression would select every test
+        print(ctest_regex(directories) or '^$')
+    else:
+        for dir_ in directories:
+            print(dir_)
+
+
+def headers_command(args):
+    """ Print the most expensive headers, and write the full report.
+
+    """
+
+    costs = header_costs(make_include_graph(args))
+
+    if args.json:
+        report = {
+            'path': os.path.abspath(args.path),
+            'total_parse_cost': sum(item['parse_cost'] for item in costs),
+            'headers': costs
+            }
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.top:
+        print(format_table(costs, args.top), end='')
+
+
+def time_trace_command(args):
+    """ Print the test directories, headers and templates taking the
+    most compile time, and write the full report.
+
+    """
+
+    manifest = None
+    if args.source_manifest:
+        manifest = os.path.join(args.path, args.source_manifest)
+
+    report = TimeTraceReport(
+        NJOYSourceTree(args.path, manifest),
+        os.path.join(args.path, args.build_dir)
+        )
+    if not report.units:
+        raise Exception('No time traces found in {}; configure with clang '
+                        'and the time trace option.'.format(args.build_dir))
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({
+                'path': os.path.abspath(args.path),
+                'test_directories': report.test_directories(),
+                'headers': report.headers(),
+                'templates': report.templates()
+                }, f, indent=2)
+
+    if args.top:
+        print(format_report(report, args.top), end='')
+
+
+def cache_stats_command(args):
+    """ Print the compiler cache hit rate of every module, from the
+    ccache statistics log in the build directory.
+
+    """
+
+    filename = os.path.join(args.path, args.build_dir, 'ccache_stats.log')
+    if not os.path.isfile(filename):
+        raise Exception('No ccache statistics log in {}; it requires the '
+                        'compiler cache option and ccache 4.4 or later.'
+                        ''.format(args.build_dir))
+
+    modules = CacheStatsLog(filename, args.path, args.name).modules()
+    for entry in modules:
+        entry['hit_rate'] = '{:.1%}'.format(entry['hit_rate'])
+
+    print(output.format_table(
+        modules,
+        (('hit_rate', 'hit rate'), ('hits', 'hits'), ('misses', 'misses'),
+         ('uncacheable', 'uncacheable'), ('compilations', 'total')),
+        ('module', 'module')
+        ), end='')
+
+    if args.reset:
+        os.remove(filename)
+
+
+if __name__ == '__main__':
+    main()
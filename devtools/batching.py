@@ -0,0 +1,66 @@
+def balanced_batches(items, weights, count, limit=None, groups=None):
+    """ Split an ordered list of items into contiguous batches of
+    roughly equal total weight.
+
+    Batches are filled in order, so related items that are next to each
+    other (e.g. files in the same directory) stay together.  Where
+    possible, a batch is closed at a change of group rather than in the
+    middle of one.
+
+    Parameters
+    ----------
+    items : list
+        The items to split, in the order they should be batched.
+    weights : list of float
+        The weight (e.g. source size) of each item.
+    count : int
+        The number of batches to aim for.
+    limit : int, optional
+        The maximum number of items in a batch.  More than count batches
+        are created if needed to respect it.
+    groups : list, optional
+        The group (e.g. directory) of each item.
+
+    Returns
+    -------
+    list of lists of items
+
+    """
+
+    if not items:
+        return []
+
+    if groups is None:
+        groups = [None] * len(items)
+
+    batches = []
+    current = []
+    weight = 0.
+    remaining = float(sum(weights))
+
+    for index, item in enumerate(items):
+        w = weights[index]
+
+        if current:
+            # the ideal weight of the current batch, given what is left
+            target = (weight + remaining) / max(count - len(batches), 1)
+
+            full = limit is not None and len(current) >= limit
+            if groups[index] == groups[index - 1]:
+                # only split a group when the batch would grow far
+                # beyond its target
+                overweight = weight + w > 1.5 * target
+            else:
+                overweight = weight + w / 2. > target
+
+            if full or (overweight and len(batches) < count - 1):
+                batches.append(current)
+                current = []
+                weight = 0.
+
+        current.append(item)
+        weight += w
+        remaining -= w
+
+    batches.append(current)
+    return batches
@@ -1,19 +1,34 @@
+import fnmatch
+import io
+import json
+import math
 import os
-from textwrap import dedent
+import re
+from textwrap import dedent, indent
 
+from .batching import balanced_batches
+from .change_impact import affected_test_directories
+from .components import ComponentGraph
+from .include_graph import IncludeGraph
 from .njoy_source_tree import NJOYSourceTree
-from .dependencies import Dependency, Dependencies, ReleaseDependencies
+from .precompiled_headers import select_precompiled_headers
+from .output import write_if_changed
+from .dependencies import Dependency, Dependencies, ReleaseDependencies, \
+                          LocalDependencies, write_partial_fetch_script
 
 
 class BuildSystem:
 
-    def __init__(self, path, name=None):
+    def __init__(self, path, name=None, manifest=None, rescan=False):
         """ Object controlling the writing of build system files.
 
         Currently only supports C++ modules containing cpp and hpp
         files.  Will be extended to support Fortran modules and (once
         a pattern is established) Python bindings.
 
+        The manifest and rescan arguments are passed on to
+        NJOYSourceTree to enable incremental scans of the source tree.
+
         """
 
         # initialize variables
@@ -21,7 +36,7 @@ class BuildSystem:
         self._name = name
 
         # source tree
-        self._tree = NJOYSourceTree(self.path)
+        self._tree = NJOYSourceTree(self.path, manifest, rescan)
 
         # dependencies
         self._dependencies = Dependencies()
@@ -30,6 +45,82 @@ class BuildSystem:
         self.logging = True
         self.executable = False
 
+        # unity build: compiled sources are grouped into batches of at
+        # most unity_batch_size files (disabled if None), except for
+        # files matching one of the glob patterns in unity_exclude
+        self.unity_batch_size = None
+        self.unity_exclude = []
+
+        # precompiled headers: the most widely included headers, up to a
+        # combined size of pch_size_limit bytes, are precompiled once
+        # and reused by the test executables
+        self.precompiled_headers = False
+        self.pch_size_limit = 1 << 20
+
+        # object library: the sources of a compiled module are compiled
+        # once, in a <name>.objects OBJECT library from which the project
+        # target is built; with shared_tests, the tests link against a
+        # <name>.shared library built from the same objects
+        self.object_library = False
+        self.shared_tests = False
+
+        # component libraries: the sources of a compiled library are
+        # split into one <name>.<component> library per directory under
+        # src/<name>/ (see ComponentGraph), aggregated by the project
+        # target, and every test links only the components it includes
+        self.component_libraries = False
+
+        # test shards: if set, test directories are combined into about
+        # this many test executables (see _test_shards)
+        self.test_shards = None
+
+        # test scheduling: if enabled, every test gets the COST recorded
+        # in test_costs (test name to seconds, e.g. from a TestHistory),
+        # the PROCESSORS of the first matching (glob pattern, count) pair
+        # in test_processors and a RESOURCE_LOCK on every data file it
+        # shares with another test directory
+        self.test_scheduling = False
+        self.test_costs = {}
+        self.test_processors = []
+
+        # test discovery: None gives one CTest entry per test directory,
+        # 'static' one entry per test case found in the test sources and
+        # 'catch' the entries found by catch_discover_tests at build time
+        # (directories for which this is not possible keep one entry)
+        self.test_discovery = None
+
+        # include graph: parsed include directives are cached in this
+        # JSON file (not cached if None)
+        self.include_graph_cache = None
+
+        # time trace: clang compilation profiles (-ftime-trace) are
+        # written next to the object files
+        self.time_trace = False
+
+        # performance profiles: CMake options for link time optimization,
+        # tuning for the host processor and profile-guided optimization
+        self.performance_profiles = False
+
+        # compiler cache: ccache or sccache is used as the compiler
+        # launcher, with paths normalized for hits across checkouts
+        self.compiler_cache = False
+
+        # presets: number of parallel build and test jobs in the
+        # CMakePresets.json file (left to Ninja and CTest if None)
+        self.preset_jobs = None
+
+        # lazily evaluated
+        self._include_graph = None
+        self._component_graph = None
+        self._pch_headers = None
+        self._shards = None
+        self._test_pch_list = None
+        self._shared_data = None
+
+        # generated files, split by whether their contents changed
+        self.changed_files = []
+        self.unchanged_files = []
+
 
     ###################################################################
     # Properties
@@ -92,8 +183,8 @@ class BuildSystem:
 
         """
 
-        # setup
-        test_directories = self._tree.list_test_directories()
+        # setup, sharded test directories have no CMakeLists.txt
+        test_directories = self._test_shards()[1]
 
         # loop over all test directories
         for dir_ in test_directories:
@@ -102,9 +193,12 @@ class BuildSystem:
             self._one_test( dir_ )
 
 
-    def write_test_list(self):
+    def write_test_list(self, directories=None):
         """ Write the unit_testing.cmake file for the repository.
 
+        If a list of test directories is given (the ones affected by a
+        change, for instance), only these are added.
+
         """
 
         # setup
@@ -121,7 +215,7 @@ class BuildSystem:
             )
 
         # create CMake file
-        with open(filename, 'w') as f:
+        with io.StringIO() as f:
 
             f.write(dedent("""\
                 #######################################################################
@@ -130,18 +224,57 @@ class BuildSystem:
 
                 message( STATUS "Adding {} unit testing" )
                 enable_testing()
+                """.format(self.name))
+                )
+
+            # catch_discover_tests comes with Catch, when available
+            if self.test_discovery == 'catch':
+                f.write('include( Catch OPTIONAL )\n')
+
+            f.write('\n\n')
 
+            # header-only libraries and component libraries precompile
+            # their headers in a dedicated target shared by the tests
+            if (self._tree.header_only or self._use_components()) \
+                    and self._list_pch_headers():
+                f.write(self._test_pch())
 
+            f.write(dedent("""\
                 #######################################################################
                 # Unit testing directories
                 #######################################################################
 
-                """.format(self.name))
+                """)
                 )
 
+            shards, test_directories = self._test_shards()
+            if directories is not None:
+                selected = set(directories)
+                shards = [[d for d in shard if d in selected]
+                          for shard in shards]
+                shards = [shard for shard in shards if shard]
+                test_directories = [d for d in test_directories
+                                    if d in selected]
+
             for dir_ in test_directories:
                 f.write('add_subdirectory( {} )\n'.format(dir_))
 
+            # test shards
+            if shards:
+                f.write(dedent("""\
+
+
+                    #######################################################################
+                    # Unit testing shards
+                    #######################################################################
+
+                    """)
+                    )
+                for index, directories in enumerate(shards):
+                    f.write(self._shard(index, directories))
+
+            self._write(filename, f.getvalue())
+
     def write_cmakelists(self):
         """ Write the CMakeLists.txt file for the project.
 
@@ -152,7 +285,7 @@ class BuildSystem:
             self._path,
             'CMakeLists.txt'
             )
-        f = open(filename, 'w')
+        f = io.StringIO()
 
         # preamble, setup
         f.write(dedent("""\
@@ -184,12 +317,30 @@ class BuildSystem:
             set( release_flags "-O3" )
             set( debug_flags "-O0" "-g" )
 
-            
             """.format(self.name))
             )
 
+        if self.time_trace:
+            f.write(dedent("""\
+                option( {0}_time_trace
+                    "Write clang compilation profiles next to the object files" ON
+                    )
+                if( {0}_time_trace AND CMAKE_CXX_COMPILER_ID MATCHES "Clang" )
+                    list( APPEND common_flags "-ftime-trace" )
+                endif()
+
+                """.format(self.name))
+                )
+
+        if self.performance_profiles:
+            f.write(self._performance_profiles())
+
+        if self.compiler_cache:
+            f.write(self._compiler_cache())
+
+        f.write('\n')
+
         # dependencies
-        print( self.dependencies, len(self.dependencies) )
         if self.dependencies:
             f.write(dedent("""\
                 ########################################################################
@@ -232,39 +383,61 @@ class BuildSystem:
         else:
             link_type = 'PUBLIC'
 
-        if self.executable:
-            f.write('add_executable( {} '.format(self.name))
-        else:
-            f.write('add_library( {} '.format(self.name))
+        if self._use_components():
+            # one library per component, and the project target
+            # aggregating them
+            f.write(self._component_targets())
 
-        if self._tree.header_only:
-            f.write('INTERFACE')
         else:
-            for file_ in self._tree.list_compiled_source():
-                f.write('\n    {}'.format(file_))
-        f.write('\n    )\n')
+            # the target compiling the sources
+            target = self._source_target()
+
+            if self._use_object_library():
+                f.write('add_library( {} OBJECT'.format(target))
+            elif self.executable:
+                f.write('add_executable( {} '.format(target))
+            else:
+                f.write('add_library( {} '.format(target))
+
+            if self._tree.header_only:
+                f.write('INTERFACE')
+            else:
+                for file_ in self._tree.list_compiled_source():
+                    f.write('\n    {}'.format(file_))
+            f.write('\n    )\n')
+
+            f.write(
+                'target_include_directories( {0} {1} src/ )\n'
+                ''.format(target, link_type)
+                )
 
-        f.write(
-            'target_include_directories( {0} {1} src/ )\n'
-            ''.format(self.name, link_type)
-            )
+            if self.dependencies:
+                f.write('target_link_libraries( {}\n'.format(target))
+                for d in self.dependencies:
+                    if d.transitive:
+                        continue
+                    f.write('    {0} {1}\n'.format(link_type, d.name))
+                f.write('    )\n')
+
+            if not self._tree.header_only:
+                f.write(dedent("""\
+                    target_compile_options( {} PRIVATE
+                        ${{common_flags}}
+                        $<$<BOOL:${{strict_compile}}>:${{strict_flags}}>
+                        $<$<CONFIG:DEBUG>:${{debug_flags}}>
+                        $<$<CONFIG:RELEASE>:${{release_flags}}>
+                        )
+                    """.format(target))
+                    )
 
-        if self.dependencies:
-            f.write('target_link_libraries( {}\n'.format(self.name))
-            for d in self.dependencies:
-                f.write('    {0} {1}\n'.format(link_type, d.name))
-            f.write('    )\n')
+                if self._list_pch_headers():
+                    f.write(self._library_pch())
 
-        if not self._tree.header_only:
-            f.write(dedent("""\
-                target_compile_options( {} PRIVATE
-                    ${{common_flags}}
-                    $<$<BOOL:${{strict_compile}}>:${{strict_flags}}>
-                    $<$<CONFIG:DEBUG>:${{debug_flags}}>
-                    $<$<CONFIG:RELEASE>:${{release_flags}}>
-                    )
-                """.format(self.name))
-                )
+                if self.unity_batch_size:
+                    f.write(self._unity_build())
+
+                if self._use_object_library():
+                    f.write(self._object_library_targets())
 
         f.write('\n\n')
 
@@ -280,17 +453,20 @@ class BuildSystem:
                 if( {}_unit_tests )
                     include( cmake/unit_testing.cmake )
                 endif()
-            
-            endif()
             """.format(self.name))
             )
 
-        # close file
-        f.close()
+        if self.performance_profiles:
+            f.write(self._pgo_training())
 
-        # report completion
-        if self.logging:
-            print( 'Wrote CMakeLists.txt.' )
+        f.write(dedent("""\
+            
+            endif()
+            """)
+            )
+
+        # write file
+        self._write(filename, f.getvalue())
 
     def write_dependencies(self):
         """ Write Dependencies CMake file.  Location depends on
@@ -305,22 +481,794 @@ class BuildSystem:
 
         if isinstance(self.dependencies, ReleaseDependencies):
             filename = 'release_dependencies.cmake'
+        elif isinstance(self.dependencies, LocalDependencies):
+            filename = 'local_dependencies.cmake'
         else:
             filename = 'develop_dependencies.cmake'
 
-        self.dependencies.cmake_file(
-            os.path.join(
+        filename = os.path.join(
+            self._path,
+            'cmake',
+            filename
+            )
+        self._record(filename, self.dependencies.cmake_file(filename))
+
+        # download step of partially cloned or sparse dependencies
+        if self.dependencies.partial_fetch:
+            filename = os.path.join(
                 self._path,
                 'cmake',
-                filename
+                'git_partial_fetch.cmake'
                 )
-            )
+            self._record(filename, write_partial_fetch_script(filename))
+
+    def write_presets(self):
+        """ Write the CMakePresets.json file for the repository.
+
+        The configure presets use Ninja: debug, release, performance
+        (release with interprocedural optimization and tuning for the
+        host processor, if the performance profiles are enabled) and
+        multi, a Ninja Multi-Config build of the debug and release
+        configurations.  Every configure preset has a build preset and,
+        if the module has tests, a test preset of the same name (two for
+        multi: multi-debug and multi-release).  Tests are run in a fixed
+        order so that the test costs recorded by CTest remain meaningful.
+
+        If preset_jobs is set, the build and test presets run that many
+        jobs in parallel.  Otherwise the number of jobs is left out, so
+        that the file does not depend on the machine writing it: Ninja
+        then uses all processors, and CTest the CTEST_PARALLEL_LEVEL
+        environment variable.
+
+        """
+
+        jobs = self.preset_jobs
+
+        # configurations: name, generator, cache variables and, for the
+        # multi-config generator, the build configurations
+        configurations = [
+            ('debug', 'Ninja', {'CMAKE_BUILD_TYPE': 'Debug'}, None),
+            ('release', 'Ninja', {'CMAKE_BUILD_TYPE': 'Release'}, None)
+            ]
+        if self.performance_profiles:
+            configurations.append((
+                'performance', 'Ninja', {
+                    'CMAKE_BUILD_TYPE': 'Release',
+                    '{}_ipo'.format(self.name): 'ON',
+                    '{}_native'.format(self.name): 'ON'
+                    },
+                None
+                ))
+        configurations.append((
+            'multi', 'Ninja Multi-Config',
+            {'CMAKE_CONFIGURATION_TYPES': 'Debug;Release'},
+            ('Debug', 'Release')
+            ))
+
+        presets = {
+            'version': 2,
+            'cmakeMinimumRequired': {'major': 3, 'minor': 20, 'patch': 0},
+            'configurePresets': [],
+            'buildPresets': [],
+            }
+        tests = bool(self._tree.list_test_directories())
+        if tests:
+            presets['testPresets'] = []
+
+        for name, generator, variables, types in configurations:
+            presets['configurePresets'].append({
+                'name': name,
+                'displayName': '{} ({})'.format(name.capitalize(), generator),
+                'generator': generator,
+                'binaryDir': '${sourceDir}/bin/${presetName}',
+                'cacheVariables': variables
+                })
+
+            for type_ in types or (None,):
+                preset = {'name': name, 'configurePreset': name}
+                if type_:
+                    preset['name'] = '{}-{}'.format(name, type_.lower())
+                    preset['configuration'] = type_
+
+                build = dict(preset)
+                execution = {}
+                if jobs:
+                    build['jobs'] = jobs
+                    execution['jobs'] = jobs
+                execution['scheduleRandom'] = False
+
+                presets['buildPresets'].append(build)
+                if tests:
+                    presets['testPresets'].append(dict(
+                        preset,
+                        output={'outputOnFailure': True},
+                        execution=execution
+                        ))
+
+        filename = os.path.join(self._path, 'CMakePresets.json')
+        self._write(filename, json.dumps(presets, indent=2) + '\n')
+
+    def affected_test_directories(self, changed, ignore=()):
+        """ Return the test directories affected by a list of changed
+        files (relative to the module path), ignoring the changed files
+        matching one of the given glob patterns.
 
+        """
+
+        return affected_test_directories(self._graph(), changed, ignore)
 
     ###################################################################
     # Private functions
     ###################################################################
 
+    def _write(self, filename, content):
+        """ Write a generated file, leaving it untouched if its contents
+        did not change.
+
+        """
+
+        self._record(filename, write_if_changed(filename, content))
+
+    def _record(self, filename, changed):
+        """ Record and report whether a generated file changed.
+
+        """
+
+        relpath = os.path.relpath(filename, start=self._path)
+        if changed:
+            self.changed_files.append(relpath)
+        else:
+            self.unchanged_files.append(relpath)
+
+        if self.logging:
+            if changed:
+                print( 'Wrote {}.'.format(relpath) )
+            else:
+                print( '{} is unchanged.'.format(relpath) )
+
+    def _unity_batches(self, files=None):
+        """ Return the unity batches of the given compiled sources (all
+        of them by default) and the list of files excluded from unity
+        builds.
+
+        Batches are balanced by source size and keep files from the same
+        directory together where possible.
+
+        """
+
+        if files is None:
+            files = self._tree.list_compiled_source()
+
+        sources = []
+        excluded = []
+        for file_ in files:
+            if any(fnmatch.fnmatch(file_, p) for p in self.unity_exclude):
+                excluded.append(file_)
+            else:
+                sources.append(file_)
+
+        batches = balanced_batches(
+            sources,
+            [self._size(file_) for file_ in sources],
+            count=math.ceil(len(sources) / self.unity_batch_size),
+            limit=self.unity_batch_size,
+            groups=[os.path.dirname(file_) for file_ in sources]
+            )
+
+        return batches, excluded
+
+    def _unity_build(self):
+        """ Return the CMake code enabling a unity build of the project
+        target.
+
+        """
+
+        if self._use_components():
+            # a batch is compiled by a single target, so the sources of
+            # each component are batched separately
+            batches = []
+            excluded = []
+            for _, sources in self._components().components:
+                items, skipped = self._unity_batches(sources)
+                batches += items
+                excluded += skipped
+        else:
+            batches, excluded = self._unity_batches()
+
+        result = dedent("""\
+
+            option( {0}_unity_build
+                "Compile {0} sources in unity batches" ON
+                )
+            if( {0}_unity_build AND CMAKE_VERSION VERSION_GREATER_EQUAL 3.18 )
+                set_target_properties( {1} PROPERTIES
+                    UNITY_BUILD ON
+                    UNITY_BUILD_MODE GROUP
+                    )
+            """).format(self.name, ' '.join(self._compiled_targets()))
+
+        for index, batch in enumerate(batches):
+            result += '    set_source_files_properties(\n'
+            for file_ in batch:
+                result += '        {}\n'.format(file_)
+            result += (
+                '        PROPERTIES UNITY_GROUP "{}_unity_{}"\n'
+                '        )\n'.format(self.name, index)
+                )
+
+        if excluded:
+            result += '    set_source_files_properties(\n'
+            for file_ in excluded:
+                result += '        {}\n'.format(file_)
+            result += (
+                '        PROPERTIES SKIP_UNITY_BUILD_INCLUSION ON\n'
+                '        )\n'
+                )
+
+        result += 'endif()\n'
+        return result
+
+    def _use_components(self):
+        """ Check whether the sources are compiled in component
+        libraries, which requires at least two components.
+
+        """
+
+        if not self.component_libraries or self._use_object_library() \
+                or self.executable or self._tree.header_only:
+            return False
+
+        return len(self._components().components) > 1
+
+    def _components(self):
+        """ The components of the compiled sources.
+
+        """
+
+        if self._component_graph is None:
+            self._component_graph = ComponentGraph(self._graph())
+
+        return self._component_graph
+
+    def _component_target(self, component):
+
+        return '{}.{}'.format(self.name, component)
+
+    def _compiled_targets(self):
+        """ The targets compiling the sources of the project.
+
+        """
+
+        if self._use_components():
+            return [self._component_target(component)
+                    for component, _ in self._components().components]
+        else:
+            return [self._source_target()]
+
+    def _component_targets(self):
+        """ Return the CMake code creating a library per component and
+        the project target linking all of them.
+
+        """
+
+        components = self._components()
+
+        result = ''
+        for component, sources in components.components:
+            target = self._component_target(component)
+            result += 'add_library( {}\n'.format(target)
+            for file_ in sources:
+                result += '    {}\n'.format(file_)
+            result += '    )\n'
+            result += (
+                'target_include_directories( {} PUBLIC src/ )\n'
+                ''.format(target)
+                )
+
+            links = [self._component_target(other)
+                     for other in components.links(component)]
+            links += [d.name for d in self.dependencies if not d.transitive]
+            if links:
+                result += 'target_link_libraries( {}\n'.format(target)
+                for link in links:
+                    result += '    PUBLIC {}\n'.format(link)
+                result += '    )\n'
+
+            result += dedent("""\
+                target_compile_options( {} PRIVATE
+                    ${{common_flags}}
+                    $<$<BOOL:${{strict_compile}}>:${{strict_flags}}>
+                    $<$<CONFIG:DEBUG>:${{debug_flags}}>
+                    $<$<CONFIG:RELEASE>:${{release_flags}}>
+                    )
+
+                """.format(target))
+
+        result += 'add_library( {} INTERFACE )\n'.format(self.name)
+        result += 'target_link_libraries( {}\n'.format(self.name)
+        for target in self._compiled_targets():
+            result += '    INTERFACE {}\n'.format(target)
+        result += '    )\n'
+
+        if self._list_pch_headers():
+            result += self._library_pch()
+
+        if self.unity_batch_size:
+            result += self._unity_build()
+
+        return result
+
+    def _use_object_library(self):
+
+        return self.object_library and not self._tree.header_only
+
+    def _source_target(self):
+        """ The target compiling the sources of the project.
+
+        """
+
+        if self._use_object_library():
+            return '{}.objects'.format(self.name)
+        else:
+            return self.name
+
+    def _test_library(self):
+        """ The library the test executables link against.
+
+        """
+
+        if self._use_object_library() and self.shared_tests:
+            return '${{{}_test_library}}'.format(self.name)
+        else:
+            return self.name
+
+    def _test_libraries(self, files):
+        """ The libraries a test executable with the given sources links
+        against: the components these sources include or, without
+        components, the test library.
+
+        """
+
+        if self._use_components():
+            libraries = [self._component_target(component) for component
+                         in self._components().used_by(files)]
+            return libraries or [self.name]
+
+        return [self._test_library()]
+
+    def _object_library_targets(self):
+        """ Return the CMake code creating the project target (and the
+        shared library for the tests) from the object library.
+
+        """
+
+        if self.executable:
+            result = dedent("""\
+
+                add_executable( {0} )
+                target_link_libraries( {0} PRIVATE {0}.objects )
+                """).format(self.name)
+        else:
+            result = dedent("""\
+
+                add_library( {0} )
+                target_link_libraries( {0} PUBLIC {0}.objects )
+                """).format(self.name)
+
+        if self.shared_tests:
+            result += dedent("""\
+
+                option( {0}_shared_tests
+                    "Link the {0} unit tests against a shared library" ON
+                    )
+                if( {0}_shared_tests )
+                    set_target_properties( {0}.objects PROPERTIES
+                        POSITION_INDEPENDENT_CODE ON
+                        )
+                    add_library( {0}.shared SHARED )
+                    target_link_libraries( {0}.shared PUBLIC {0}.objects )
+                    set( {0}_test_library {0}.shared )
+                """).format(self.name)
+
+            # tests reusing the precompiled headers of the position
+            # independent objects must be compiled the same way
+            if self._list_pch_headers():
+                result += (
+                    '    set( {0}_test_flags '
+                    '$<$<NOT:$<CXX_COMPILER_ID:MSVC>>:-fPIC> )\n'
+                    ''.format(self.name)
+                    )
+
+            result += dedent("""\
+                else()
+                    set( {0}_test_library {0} )
+                endif()
+                """).format(self.name)
+
+        return result
+
+    def _graph(self):
+        """ The include graph of the source tree.
+
+        """
+
+        if self._include_graph is None:
+            self._include_graph = IncludeGraph(
+                self._tree,
+                self.include_graph_cache
+                )
+
+        return self._include_graph
+
+    def _list_pch_headers(self):
+        """ Return the headers to precompile, if enabled.
+
+        """
+
+        if not self.precompiled_headers:
+            return []
+
+        if self._pch_headers is None:
+            self._pch_headers = select_precompiled_headers(
+                self._graph(),
+                self.pch_size_limit
+                )
+
+        return self._pch_headers
+
+    def _pch_list(self, target, headers=None):
+        """ Return the target_precompile_headers call for a target,
+        precompiling the given headers (all of them by default).
+
+        """
+
+        if headers is None:
+            headers = self._list_pch_headers()
+
+        result = '    target_precompile_headers( {} PRIVATE\n'.format(target)
+        for header in headers:
+            result += '        ${{PROJECT_SOURCE_DIR}}/{}\n'.format(header)
+        result += '        )\n'
+
+        return result
+
+    def _included_pch_headers(self, files):
+        """ Return the headers to precompile that the given files
+        include, directly or transitively.
+
+        """
+
+        graph = self._graph()
+        included = set()
+        for file_ in files:
+            included |= graph.closure(file_)
+
+        return [header for header in self._list_pch_headers()
+                if header in included]
+
+    def _pch_option(self):
+
+        return dedent("""\
+            option( {0}_precompiled_headers
+                "Precompile the most widely included {0} headers" ON
+                )
+            """).format(self.name)
+
+    def _library_pch(self):
+        """ Return the CMake code precompiling headers for a compiled
+        project target.
+
+        """
+
+        result = '\n' + self._pch_option()
+        result += (
+            'if( {0}_precompiled_headers AND '
+            'CMAKE_VERSION VERSION_GREATER_EQUAL 3.16 )\n'
+            ''.format(self.name)
+            )
+        if self._use_components():
+            # each component precompiles the headers its own sources
+            # include: components of a shared build cannot reuse each
+            # other's precompiled headers (<target>_EXPORTS differs), and
+            # a common list would make every component depend on all of
+            # them.  The tests use dedicated targets instead.
+            for component, sources in self._components().components:
+                headers = self._included_pch_headers(sources)
+                if headers:
+                    result += self._pch_list(
+                        self._component_target(component), headers)
+            result += 'endif()\n'
+
+            return result
+
+        target = self._source_target()
+        result += self._pch_list(target)
+        if self._use_object_library():
+            result += (
+                '    set( {0}_pch_target {1} )\n'.format(self.name, target))
+        else:
+            # the sources of a shared library are compiled differently
+            # (position independent, with <target>_EXPORTS defined), so
+            # the tests cannot reuse its precompiled headers
+            result += (
+                '    if( NOT BUILD_SHARED_LIBS )\n'
+                '        set( {0}_pch_target {1} )\n'
+                '    endif()\n'.format(self.name, target)
+                )
+        result += 'endif()\n'
+
+        return result
+
+    def _test_pch(self):
+        """ Return the CMake code creating the targets that precompile
+        headers for the tests of a header-only library or of a library
+        split in components.
+
+        """
+
+        result = dedent("""\
+            #######################################################################
+            # Precompiled headers
+            #######################################################################
+
+            """)
+        # the option of a compiled library comes with its targets
+        if self._tree.header_only:
+            result += self._pch_option()
+        result += dedent("""\
+            if( {0}_precompiled_headers AND CMAKE_VERSION VERSION_GREATER_EQUAL 3.16 )
+                set( {0}_pch_source ${{CMAKE_CURRENT_BINARY_DIR}}/{0}.pch.cpp )
+                if( NOT EXISTS ${{{0}_pch_source}} )
+                    file( WRITE ${{{0}_pch_source}} "" )
+                endif()
+            """).format(self.name)
+        for target, libraries, headers in self._test_pch_targets():
+            result += indent(dedent("""\
+                add_library( {1} OBJECT ${{{0}_pch_source}} )
+                set_target_properties( {1} PROPERTIES
+                    CXX_STANDARD 17
+                    CXX_STANDARD_REQUIRED YES
+                    )
+                target_link_libraries( {1} PUBLIC {2} )
+                target_compile_options( {1} PRIVATE
+                    ${{common_flags}}
+                    $<$<BOOL:${{strict_compile}}>:${{strict_flags}}>
+                    $<$<CONFIG:DEBUG>:${{debug_flags}}>
+                    $<$<CONFIG:RELEASE>:${{release_flags}}>
+                    )
+                """).format(self.name, target, ' '.join(libraries)), '    ')
+            result += self._pch_list(target, headers)
+        if self._tree.header_only:
+            result += '    set( {0}_pch_target {0}.pch )\n'.format(self.name)
+        result += 'endif()\n\n\n'
+
+        return result
+
+    def _test_pch_targets(self):
+        """ Return the (target, libraries, headers) triplets of the
+        targets precompiling headers for the tests.
+
+        A header-only library has a single target.  With components,
+        there is one target per set of components linked by the tests,
+        precompiling the headers that all of these tests include, so
+        that a test is only rebuilt for (and only links the code of)
+        headers it includes itself.
+
+        """
+
+        if self._tree.header_only:
+            return [(self.name + '.pch', [self.name],
+                     self._list_pch_headers())]
+
+        if self._test_pch_list is None:
+            common = {}
+            for sources in self._test_sources():
+                libraries = tuple(self._test_libraries(sources))
+                headers = self._included_pch_headers(sources)
+                if libraries in common:
+                    headers = [h for h in common[libraries] if h in headers]
+                common[libraries] = headers
+
+            self._test_pch_list = [
+                (self._test_pch_target(libraries), list(libraries), headers)
+                for libraries, headers in sorted(common.items())
+                if headers
+                ]
+
+        return self._test_pch_list
+
+    def _test_pch_target(self, libraries):
+        """ The target precompiling headers for the tests linking the
+        given component libraries.
+
+        """
+
+        return '{}.pch{}'.format(
+            self.name,
+            ''.join(library[len(self.name):] for library in libraries
+                    if library != self.name)
+            )
+
+    def _compiler_cache(self):
+        """ Return the CMake code selecting a compiler cache as the
+        compiler launcher.
+
+        Paths within the source tree are rewritten to relative paths
+        (ccache's base_dir, and -ffile-prefix-map for __FILE__ and debug
+        information) so that builds in different checkouts share cached
+        objects.  ccache records the result of every compilation in a
+        statistics log in the build directory.
+
+        """
+
+        return dedent("""\
+            # Compiler cache
+            set( {0}_compiler_cache "auto"
+                CACHE STRING
+                "Compiler cache to use: auto, ccache, sccache or none"
+                )
+            set_property( CACHE {0}_compiler_cache PROPERTY STRINGS auto ccache sccache none )
+
+            if( NOT {0}_compiler_cache STREQUAL "none" AND NOT CMAKE_CXX_COMPILER_LAUNCHER )
+                if( {0}_compiler_cache STREQUAL "auto" )
+                    find_program( {0}_compiler_cache_program NAMES ccache sccache )
+                else()
+                    find_program( {0}_compiler_cache_program NAMES ${{{0}_compiler_cache}} )
+                endif()
+
+                if( {0}_compiler_cache_program )
+                    message( STATUS "Using compiler cache ${{{0}_compiler_cache_program}}" )
+                    get_filename_component( {0}_compiler_cache_name
+                        ${{{0}_compiler_cache_program}} NAME_WE
+                        )
+                    if( {0}_compiler_cache_name STREQUAL "ccache" )
+                        set( CMAKE_CXX_COMPILER_LAUNCHER
+                            ${{CMAKE_COMMAND}} -E env
+                            CCACHE_BASEDIR=${{CMAKE_SOURCE_DIR}}
+                            CCACHE_NOHASHDIR=true
+                            CCACHE_STATSLOG=${{CMAKE_BINARY_DIR}}/ccache_stats.log
+                            ${{{0}_compiler_cache_program}}
+                            )
+                    else()
+                        set( CMAKE_CXX_COMPILER_LAUNCHER ${{{0}_compiler_cache_program}} )
+                    endif()
+
+                    include( CheckCXXCompilerFlag )
+                    check_cxx_compiler_flag( "-ffile-prefix-map=a=b" {0}_file_prefix_map )
+                    if( {0}_file_prefix_map )
+                        list( APPEND common_flags "-ffile-prefix-map=${{CMAKE_SOURCE_DIR}}/=" )
+                    endif()
+                elseif( NOT {0}_compiler_cache STREQUAL "auto" )
+                    message( WARNING "Compiler cache ${{{0}_compiler_cache}} not found" )
+                endif()
+            endif()
+
+            """).format(self.name)
+
+    def _performance_profiles(self):
+        """ Return the CMake options selecting the performance profile:
+        interprocedural optimization, tuning for the host processor and
+        the phase of profile-guided optimization.
+
+        """
+
+        return dedent("""\
+            # Performance profiles
+            option( {0}_ipo
+                "Use interprocedural (link time) optimization in release builds" OFF
+                )
+            option( {0}_native
+                "Tune release builds for the host processor" OFF
+                )
+            set( {0}_pgo "OFF"
+                CACHE STRING
+                "Profile-guided optimization phase: OFF, GENERATE or USE"
+                )
+            set_property( CACHE {0}_pgo PROPERTY STRINGS OFF GENERATE USE )
+            set( {0}_pgo_dir "${{CMAKE_BINARY_DIR}}/pgo"
+                CACHE PATH
+                "Directory of the profile-guided optimization profiles"
+                )
+
+            if( {0}_ipo )
+                include( CheckIPOSupported )
+                check_ipo_supported( RESULT {0}_ipo_supported OUTPUT {0}_ipo_output )
+                if( {0}_ipo_supported )
+                    set( CMAKE_INTERPROCEDURAL_OPTIMIZATION_RELEASE ON )
+                else()
+                    message( WARNING "IPO is not supported: ${{{0}_ipo_output}}" )
+                endif()
+            endif()
+
+            if( {0}_native )
+                include( CheckCXXCompilerFlag )
+                check_cxx_compiler_flag( "-march=native" {0}_march_native )
+                if( {0}_march_native )
+                    list( APPEND release_flags "-march=native" )
+                else()
+                    message( WARNING "-march=native is not supported" )
+                endif()
+            endif()
+
+            if( {0}_pgo STREQUAL "GENERATE" OR {0}_pgo STREQUAL "USE" )
+                if( CMAKE_CXX_COMPILER_ID STREQUAL "GNU" )
+                    set( {0}_pgo_generate "-fprofile-generate=${{{0}_pgo_dir}}" )
+                    set( {0}_pgo_use "-fprofile-use=${{{0}_pgo_dir}}"
+                        "-fprofile-correction" "-Wno-missing-profile" )
+                elseif( CMAKE_CXX_COMPILER_ID MATCHES "Clang" )
+                    set( {0}_pgo_generate "-fprofile-generate=${{{0}_pgo_dir}}" )
+                    set( {0}_pgo_use
+                        "-fprofile-use=${{{0}_pgo_dir}}/default.profdata"
+                        "-Wno-profile-instr-unprofiled" )
+                else()
+                    message( FATAL_ERROR
+                        "Profile-guided optimization requires GCC or Clang" )
+                endif()
+                if( {0}_pgo STREQUAL "GENERATE" )
+                    list( APPEND common_flags ${{{0}_pgo_generate}} )
+                    add_link_options( ${{{0}_pgo_generate}} )
+                else()
+                    list( APPEND common_flags ${{{0}_pgo_use}} )
+                    add_link_options( ${{{0}_pgo_use}} )
+                endif()
+            elseif( NOT {0}_pgo STREQUAL "OFF" )
+                message( FATAL_ERROR "Unknown {0}_pgo phase: ${{{0}_pgo}}" )
+            endif()
+
+            """).format(self.name)
+
+    def _pgo_training(self):
+        """ Return the CMake code of the target running the training
+        run of profile-guided optimization: the unit tests of an
+        instrumented build, with the raw Clang profiles merged
+        afterwards.
+
+        """
+
+        return indent(dedent("""\
+
+                # profile-guided optimization training run
+                if( {0}_unit_tests AND {0}_pgo STREQUAL "GENERATE" )
+                    set( {0}_pgo_train
+                        COMMAND ${{CMAKE_COMMAND}} -E remove_directory ${{{0}_pgo_dir}}
+                        COMMAND ${{CMAKE_CTEST_COMMAND}} -C $<CONFIG>
+                        )
+                    if( CMAKE_CXX_COMPILER_ID MATCHES "Clang" )
+                        get_filename_component( {0}_compiler_dir
+                            ${{CMAKE_CXX_COMPILER}} DIRECTORY
+                            )
+                        find_program( {0}_llvm_profdata llvm-profdata
+                            HINTS ${{{0}_compiler_dir}}
+                            )
+                        file( WRITE ${{CMAKE_BINARY_DIR}}/{0}_pgo_merge.cmake
+                            "file( GLOB profiles \\"${{{0}_pgo_dir}}/*.profraw\\" )\\n"
+                            "execute_process( COMMAND \\"${{{0}_llvm_profdata}}\\" merge\\n"
+                            "    -output=\\"${{{0}_pgo_dir}}/default.profdata\\" \\${{profiles}}\\n"
+                            "    RESULT_VARIABLE result )\\n"
+                            "if( result )\\n"
+                            "    message( FATAL_ERROR \\"Could not merge the profiles\\" )\\n"
+                            "endif()\\n"
+                            )
+                        list( APPEND {0}_pgo_train
+                            COMMAND ${{CMAKE_COMMAND}} -P ${{CMAKE_BINARY_DIR}}/{0}_pgo_merge.cmake
+                            )
+                    endif()
+                    add_custom_target( {0}_pgo_train
+                        ${{{0}_pgo_train}}
+                        WORKING_DIRECTORY ${{CMAKE_BINARY_DIR}}
+                        COMMENT "Running the {0} unit tests to collect profiles"
+                        VERBATIM
+                        )
+                endif()
+            """).format(self.name), '    ')
+
+    def _size(self, relpath):
+        """ Size of a file in the source tree, in bytes.
+
+        """
+
+        return os.path.getsize(os.path.join(self._path, relpath))
+
     def _cmake_directory(self):
         """ Create cmake directory if it doesn't already exist.
 
@@ -350,7 +1298,7 @@ class BuildSystem:
         testname = dir_.split('/')[-2]
 
         # write CMakeLists.txt
-        with open(filename, 'w') as f:
+        with io.StringIO() as f:
 
             # preamble
             f.write(dedent("""\
@@ -360,67 +1308,473 @@ class BuildSystem:
                 """)
                 )
 
-            # first line
-            f.write('add_executable( {}.test\n'.format(testname))
+            # executable, with the files found when scanning the tree
+            f.write(self._test_executable(
+                testname + '.test',
+                [os.path.basename(file_)
+                 for file_ in self._tree.list_test_files(dir_)],
+                self._tree.list_test_files(dir_)
+                ))
 
-            # full relative path to dir_
-            dirname = os.path.join(
-                self.path,
-                dir_
-                )
+            # add tests
+            f.write(self._add_tests(dir_, testname + '.test'))
 
-            # files
-            for file_ in os.listdir(dirname):
+            self._write(filename, f.getvalue())
 
-                # full relative path to file_
-                fname = os.path.join(
-                    dirname,
-                    file_
-                    )
+    def _test_executable(self, target, files, sources):
+        """ Return the CMake code defining a test executable compiling
+        the given files, whose sources (relative to the module path)
+        determine the libraries it links and the precompiled headers it
+        reuses.
 
-                # skip anything not a cpp
-                if not os.path.isfile(fname):
-                    continue
-                elif not fname.endswith('.cpp'):
-                    continue
+        """
 
-                # list files
-                f.write('    {}\n'.format(file_))
+        libraries = self._test_libraries(sources)
+
+        # first line
+        result = 'add_executable( {}\n'.format(target)
+        for file_ in files:
+            result += '    {}\n'.format(file_)
+        result += '    )\n'
+
+        # link libraries
+        result += 'target_link_libraries( {}\n'.format(target)
+        for library in libraries:
+            result += '    PUBLIC {}\n'.format(library)
+        result += '    )\n'
+
+        # compile options
+        result += dedent("""\
+            target_compile_options( {} PRIVATE
+                ${{common_flags}}
+                $<$<BOOL:${{strict_compile}}>:${{strict_flags}}>
+                $<$<CONFIG:DEBUG>:${{debug_flags}}>
+                $<$<CONFIG:RELEASE>:${{release_flags}}>
+            """.format(target))
+        if self._test_library() != self.name and self._list_pch_headers():
+            result += '    ${{{}_test_flags}}\n'.format(self.name)
+        result += '    )\n'
+
+        # precompiled headers, for components those of the target for
+        # the components the test links, if any
+        if self._use_components() and self._list_pch_headers():
+            pch = self._test_pch_target(libraries)
+            if pch in [item for item, _, _ in self._test_pch_targets()]:
+                result += dedent("""\
+                    if( TARGET {0} )
+                        target_precompile_headers( {1}
+                            REUSE_FROM {0}
+                            )
+                    endif()
+                    """.format(pch, target))
+        elif self._list_pch_headers():
+            result += dedent("""\
+                if( {0}_pch_target )
+                    target_precompile_headers( {1}
+                        REUSE_FROM ${{{0}_pch_target}}
+                        )
+                endif()
+                """.format(self.name, target))
 
-            f.write('    )\n')
+        return result
 
-            # link libraries
-            f.write(dedent("""\
-                target_link_libraries( {0}.test
-                    PUBLIC {1}
+    def _test_shards(self):
+        """ Return the list of test shards (each a list of test
+        directories) and the list of test directories that are built
+        separately.
+
+        A test directory can be sharded if exactly one of its sources
+        defines the Catch main function (with CATCH_CONFIG_MAIN, alone or
+        along with test cases) and all its test case names are known
+        statically.  Directories whose test case names, source file
+        names or namespace scope definitions with external linkage clash
+        are kept in different shards.
+
+        """
+
+        if self._shards is not None:
+            return self._shards
+
+        test_directories = self._tree.list_test_directories()
+        if not self.test_shards:
+            self._shards = [], list(test_directories)
+            return self._shards
+
+        eligible = [d for d in test_directories if self._shardable(d)]
+        if len(eligible) < 2:
+            if self.logging:
+                print('Warning: fewer than two test directories can be '
+                      'sharded; no test shards are made.')
+            self._shards = [], list(test_directories)
+            return self._shards
+
+        batches = balanced_batches(
+            eligible,
+            [sum(self._size(f) for f in self._tree.list_test_files(d))
+             for d in eligible],
+            count=self.test_shards,
+            groups=[os.path.dirname(os.path.dirname(d)) for d in eligible]
+            )
+
+        # resolve clashes by moving directories to another shard
+        shards = []
+        deferred = []
+        for batch in batches:
+            shard, keys = [], set()
+            for dir_ in batch:
+                dir_keys = self._shard_keys(dir_)
+                if dir_keys & keys:
+                    deferred.append(dir_)
+                else:
+                    shard.append(dir_)
+                    keys |= dir_keys
+            shards.append((shard, keys))
+
+        for dir_ in deferred:
+            dir_keys = self._shard_keys(dir_)
+            for shard, keys in shards:
+                if not dir_keys & keys:
+                    break
+            else:
+                shard, keys = [], set()
+                shards.append((shard, keys))
+            shard.append(dir_)
+            keys |= dir_keys
+
+        sharded = set(eligible)
+        self._shards = (
+            [shard for shard, _ in shards if shard],
+            [d for d in test_directories if d not in sharded]
+            )
+        return self._shards
+
+    def _shardable(self, dir_):
+        """ Check whether a test directory can be part of a shard.
+
+        """
+
+        mains = 0
+        cases = 0
+        for file_ in self._tree.list_test_files(dir_):
+            info = self._tree.test_source_info(file_)
+            if not info['static']:
+                return False
+            if info['main']:
+                if info['main'] != 'MAIN':
+                    return False
+                mains += 1
+            cases += len(info['cases'])
+
+        return mains == 1 and cases > 0
+
+    def _shard_keys(self, dir_):
+        """ Return the Catch file tags, test case names and external
+        definitions (such as the "::chunk" of a helper function repeated
+        in every test directory) of a test directory, which must be
+        unique within a shard.
+
+        """
+
+        keys = set()
+        for file_ in self._tree.list_test_files(dir_):
+            info = self._tree.test_source_info(file_)
+            if info['cases']:
+                keys.add('#' + _file_tag(file_))
+            keys.update(info['cases'])
+            keys.update(info['symbols'])
+
+        return keys
+
+    def _shard(self, index, directories):
+        """ Return the CMake code for one test shard: a single executable
+        for several test directories, with one CTest entry per test
+        directory selecting that directory's sources by file tag.
+
+        """
+
+        target = '{}.shard{}.test'.format(self.name, index)
+
+        files, wrapped = self._shard_sources(directories)
+
+        result = ''
+        wrappers = []
+        for file_ in wrapped:
+            wrapper = '${{CMAKE_CURRENT_BINARY_DIR}}/{}.sources/{}'.format(
+                target, os.path.basename(file_))
+            result += dedent("""\
+                file( GENERATE
+                    OUTPUT {0}
+                    CONTENT "#include \\"catch.hpp\\"\\n#include \\"${{CMAKE_CURRENT_SOURCE_DIR}}/{1}\\"\\n"
                     )
-                """.format(testname, self.name))
+                set_source_files_properties( {0} PROPERTIES GENERATED ON )
+                """).format(wrapper, file_)
+            wrappers.append(wrapper)
+
+        result += self._test_executable(
+            target, files + wrappers, files + wrapped)
+
+        for dir_ in directories:
+            tags = ','.join(
+                '[#{}]'.format(_file_tag(file_))
+                for file_ in self._tree.list_test_files(dir_)
+                if self._tree.test_source_info(file_)['cases']
                 )
-    
-            # compile options
-            f.write(dedent("""\
-                target_compile_options( {}.test PRIVATE
-                    ${{common_flags}}
-                    $<$<BOOL:${{strict_compile}}>:${{strict_flags}}>
-                    $<$<CONFIG:DEBUG>:${{debug_flags}}>
-                    $<$<CONFIG:RELEASE>:${{release_flags}}>
-                    )
-                """.format(testname))
+            result += self._add_tests(dir_, target, tags)
+
+        return result + '\n'
+
+    def _shard_sources(self, directories):
+        """ Return the test sources of a shard compiled as such and the
+        test sources compiled through a wrapper.
+
+        The Catch main of the first directory is used for the shard; the
+        other sources defining CATCH_CONFIG_MAIN along with test cases
+        are compiled through a wrapper including catch.hpp first, so
+        that their own inclusion of it no longer defines the main.
+
+        """
+
+        files = []
+        wrapped = []
+        for position, dir_ in enumerate(directories):
+            for file_ in self._tree.list_test_files(dir_):
+                info = self._tree.test_source_info(file_)
+                if info['main'] and position > 0:
+                    if info['cases']:
+                        wrapped.append(file_)
+                    continue
+                files.append(file_)
+
+        return files, wrapped
+
+    def _test_sources(self):
+        """ Return the list of sources of every test executable (test
+        shards and test directories built separately).
+
+        """
+
+        result = []
+        shards, test_directories = self._test_shards()
+        for shard in shards:
+            files, wrapped = self._shard_sources(shard)
+            result.append(files + wrapped)
+        for dir_ in test_directories:
+            result.append(self._tree.list_test_files(dir_))
+
+        return result
+
+    def _add_tests(self, dir_, target, tags=None):
+        """ Return the CMake code adding the tests of a test directory,
+        run by the given test executable.
+
+        For a test shard, tags selects the Catch file tags of the
+        directory and the tests run in the directory's binary directory.
+        Depending on test_discovery, there is one test per directory or
+        one test per test case, named "<directory>.<test case>" (with
+        the characters that CMake does not accept in a test name before
+        policy CMP0110 replaced by underscores).
+
+        """
+
+        testname = dir_.split('/')[-2]
+        result = ''
+
+        # command and working directory of the test(s)
+        command = target
+        workdir = ''
+        if tags:
+            command += ' --filenames-as-tags "{}"'.format(tags)
+            workdir = '${{CMAKE_CURRENT_BINARY_DIR}}/{}'.format(dir_)
+            result += 'file( MAKE_DIRECTORY {} )\n'.format(workdir)
+
+        # one test per statically known test case
+        cases = self._test_cases(dir_)
+        if self.test_discovery == 'static' and cases:
+            for name, case in cases:
+                result += 'add_test(\n'
+                result += '    NAME {}\n'.format(name)
+                result += '    COMMAND {} {}\n'.format(
+                    target, _cmake_argument(_catch_escape(case)))
+                if workdir:
+                    result += '    WORKING_DIRECTORY {}\n'.format(workdir)
+                result += '    )\n'
+                result += self._test_properties(dir_, name)
+            return result
+
+        # one test per directory
+        single = 'add_test(\n'
+        single += '    NAME {}\n'.format(testname)
+        single += '    COMMAND {}\n'.format(command)
+        if workdir:
+            single += '    WORKING_DIRECTORY {}\n'.format(workdir)
+        single += '    )\n'
+        single += self._test_properties(dir_, testname)
+
+        if self.test_discovery != 'catch':
+            return result + single
+
+        # one test per test case listed by the test executable, with the
+        # tests of a shard restricted to the directory's file tags
+        result += 'if( COMMAND catch_discover_tests )\n'
+        result += '    catch_discover_tests( {}\n'.format(target)
+        result += '        TEST_PREFIX "{}."\n'.format(testname)
+        if tags:
+            result += '        TEST_SPEC --filenames-as-tags "{}"\n' \
+                      ''.format(tags)
+            result += '        WORKING_DIRECTORY {}\n'.format(workdir)
+        properties = self._common_properties(dir_)
+        if properties:
+            result += '        PROPERTIES\n'
+            for key, value in properties:
+                result += '            {} {}\n'.format(key, value)
+        result += '        )\n'
+        result += 'else()\n'
+        result += ''.join(
+            '    ' + line if line else line
+            for line in single.splitlines(True)
+            )
+        result += 'endif()\n'
+        return result
+
+    def _test_cases(self, dir_):
+        """ Return the (test name, test case name) pairs of the test
+        cases of a test directory, or None if the test cases cannot all
+        be determined statically or their test names are not unique.
+
+        """
+
+        testname = dir_.split('/')[-2]
+        cases = []
+        for file_ in self._tree.list_test_files(dir_):
+            info = self._tree.test_source_info(file_)
+            if not info['static']:
+                return None
+            cases.extend(
+                ('{}.{}'.format(
+                    testname,
+                    re.sub(r'[^\w.+-]+', '_', case).strip('_')
+                    ), case)
+                for case in info['cases']
                 )
 
-            # add test
-            f.write(dedent("""\
-                add_test(
-                    NAME {0}
-                    COMMAND {0}.test
-                    )
-                """.format(testname))
+        if len(set(name for name, _ in cases)) != len(cases):
+            return None
+
+        return cases
+
+    def _test_properties(self, dir_, testname):
+        """ Return the set_tests_properties call with the scheduling
+        properties of a test of a test directory, if any.
+
+        Test properties can only be set in the directory that adds the
+        test, so this follows every add_test.
+
+        """
+
+        if not self.test_scheduling:
+            return ''
+
+        properties = []
+        cost = self.test_costs.get(testname)
+        if cost:
+            properties.append(('COST', _format_cost(cost)))
+        properties += self._common_properties(dir_)
+
+        if not properties:
+            return ''
+
+        result = 'set_tests_properties( {} PROPERTIES\n'.format(testname)
+        for key, value in properties:
+            result += '    {} {}\n'.format(key, value)
+        return result + '    )\n'
+
+    def _common_properties(self, dir_):
+        """ Return the scheduling properties shared by all tests of a
+        test directory, as a list of (property, value) pairs.
+
+        """
+
+        if not self.test_scheduling:
+            return []
+
+        testname = dir_.split('/')[-2]
+        properties = []
+
+        for pattern, count in self.test_processors:
+            if fnmatch.fnmatch(testname, pattern) or \
+                    fnmatch.fnmatch(dir_, pattern):
+                properties.append(('PROCESSORS', str(count)))
+                break
+
+        locks = self._shared_data_files().get(dir_)
+        if locks:
+            properties.append(
+                ('RESOURCE_LOCK', '"{}"'.format(';'.join(locks)))
                 )
 
-        # record completion
-        if self.logging:
-            print( 'Wrote CMakeLists.txt for {} test directory.'
-                   ''.format(dir_) )
+        return properties
+
+    def _shared_data_files(self):
+        """ Return a dictionary giving, for every test directory, the
+        sorted data files it names that are also named by another test
+        directory.
+
+        """
+
+        if self._shared_data is None:
+            users = {}
+            for dir_ in self._tree.list_test_directories():
+                for file_ in self._tree.list_test_files(dir_):
+                    info = self._tree.test_source_info(file_)
+                    for data in info['files']:
+                        users.setdefault(data, set()).add(dir_)
+
+            self._shared_data = {}
+            for data, directories in sorted(users.items()):
+                if len(directories) > 1:
+                    for dir_ in directories:
+                        self._shared_data.setdefault(dir_, []).append(data)
+
+        return self._shared_data
+
+
+def _format_cost(cost):
+    """ Format a test time with two significant digits, so that small
+    variations between runs do not change the generated files.
+
+    """
+
+    return '{:g}'.format(float('{:.2g}'.format(cost)))
+
+
+def _catch_escape(name):
+    """ Escape the characters of a test case name that have a meaning
+    in a Catch test specification.
+
+    """
+
+    return re.sub(r'([\\,\[\]*])', r'\\\1', name)
+
+
+def _cmake_argument(value):
+    """ Return a CMake argument for a string, quoted and escaped
+    unless it is a plain name.
+
+    """
+
+    if re.match(r'^[\w.+-]+$', value):
+        return value
+
+    return '"{}"'.format(re.sub(r'([\\"$])', r'\\\1', value))
+
+
+def _file_tag(file_):
+    """ The tag Catch gives the test cases of a file with
+    --filenames-as-tags: the file name without its (last) extension.
+
+    """
+
+    return os.path.splitext(os.path.basename(file_))[0]
 
 
 if __name__ == '__main__':
@@ -0,0 +1,96 @@
+import fnmatch
+import os
+import re
+import sys
+
+
+def read_changed_files(filename):
+    """ Read a list of changed files, one per line, as given by git diff
+    --name-only.  A filename of "-" reads from stdin.
+
+    """
+
+    if filename == '-':
+        lines = sys.stdin.read().splitlines()
+    else:
+        with open(filename, 'r') as f:
+            lines = f.read().splitlines()
+
+    return [line.strip() for line in lines if line.strip()]
+
+
+def affected_test_directories(graph, changed, ignore=()):
+    """ Return the sorted list of test directories affected by a set of
+    changed files.
+
+    A test directory is affected if one of its sources changed or
+    includes a changed file, directly or transitively.  Since every test
+    links against the library, a changed compiled source affects every
+    test directory, as does any other changed file that is not part of
+    the include graph (build files, deleted files, ...) unless it
+    matches one of the ignored glob patterns.
+
+    Parameters
+    ----------
+    graph : IncludeGraph
+        The include graph of the source tree.
+    changed : list of str
+        The changed files, relative to the module path.
+    ignore : list of str, optional
+        Glob patterns of changed files that do not affect any test
+        (documentation, for instance).
+
+    """
+
+    tree = graph.tree
+    test_directories = tree.list_test_directories()
+    compiled = set(tree.list_compiled_source())
+    known = set(graph.files)
+
+    # test directory of every test source
+    owners = {}
+    for dir_ in test_directories:
+        for file_ in tree.list_test_files(dir_):
+            owners[file_] = dir_
+
+    affected = set()
+    for file_ in changed:
+        file_ = os.path.normpath(file_)
+        if any(fnmatch.fnmatch(file_, pattern) for pattern in ignore):
+            continue
+        if file_ in compiled or file_ not in known:
+            return list(test_directories)
+
+        for item in graph.dependents(file_) | {file_}:
+            if item in owners:
+                affected.add(owners[item])
+
+    return sorted(affected)
+
+
+def ctest_regex(test_directories):
+    """ Return a regular expression for ctest -R selecting the tests of
+    a list of test directories, including per test case tests named
+    "<directory>.<test case>".
+
+    """
+
+    names = sorted(set(dir_.split('/')[-2] for dir_ in test_directories))
+    if not names:
+        return None
+
+    return '^({})(\\.|$)'.format(
+        '|'.join(re.sub(r'([][.*+?^$(){}|\\])', r'\\\1', name)
+                 for name in names)
+        )
+
+
+if __name__ == '__main__':
+
+    from .include_graph import IncludeGraph
+    from .njoy_source_tree import NJOYSourceTree
+
+    graph = IncludeGraph(NJOYSourceTree('test_tree'))
+    directories = affected_test_directories(graph, graph.files[:1])
+    print(directories)
+    print(ctest_regex(directories))
@@ -0,0 +1,117 @@
+import os
+import re
+
+
+class CacheStatsLog:
+
+    # sources of a dependency fetched with FetchContent
+    dependency_re = re.compile(r'/_deps/([^/]+)-src/')
+
+    def __init__(self, filename, path, name=None):
+        """ The compilation results recorded by ccache in a statistics
+        log (the stats_log setting, available since ccache 4.4).
+
+        The log lists, for every compilation, the source file after a
+        "#" and then the statistics counters it updated, one per line.
+        Every compilation is attributed to the module it belongs to:
+        the repository itself or the dependency it was fetched for.
+
+        Parameters
+        ----------
+        filename : str
+            The statistics log.
+        path : str
+            The top-level path to the module.
+        name : str, optional
+            The name of the module, derived from the basename of the
+            path by default.
+
+        """
+
+        self._path = os.path.abspath(path)
+        self._name = name or os.path.basename(self._path)
+        self._modules = {}
+
+        self._read(filename)
+
+    ###################################################################
+    # Public functions
+    ###################################################################
+
+    def modules(self):
+        """ Return the compilation results of every module, as a list of
+        dictionaries with the module, the number of compilations, cache
+        hits, cache misses and uncacheable compilations, and the hit
+        rate of the cacheable compilations, by module name.
+
+        """
+
+        result = []
+        for entry in self._modules.values():
+            entry = dict(entry)
+            cacheable = entry['hits'] + entry['misses']
+            entry['hit_rate'] = entry['hits'] / cacheable if cacheable else 0.
+            result.append(entry)
+
+        return sorted(result, key=lambda item: item['module'])
+
+    ###################################################################
+    # Private functions
+    ###################################################################
+
+    def _read(self, filename):
+
+        with open(filename, 'r', errors='replace') as f:
+            lines = f.read().splitlines()
+
+        source, counters = None, set()
+        for line in lines + ['#']:
+            line = line.strip()
+            if line.startswith('#'):
+                if source is not None:
+                    self._add(source, counters)
+                source, counters = line[1:].strip(), set()
+            elif line:
+                counters.add(line)
+
+    def _add(self, source, counters):
+        """ Count one compilation as a hit (direct or preprocessed), a
+        miss or uncacheable (all other results: linking, unsupported
+        options, compiler errors, ...).
+
+        """
+
+        entry = self._entry(source)
+        entry['compilations'] += 1
+        if any(counter.endswith('cache_hit') for counter in counters):
+            entry['hits'] += 1
+        elif 'cache_miss' in counters:
+            entry['misses'] += 1
+        else:
+            entry['uncacheable'] += 1
+
+    def _entry(self, source):
+        """ Return the counters of the module a source belongs to.
+
+        """
+
+        source = os.path.abspath(source).replace(os.sep, '/')
+        match = self.dependency_re.search(source)
+        if match:
+            module = match.group(1)
+        elif source.startswith(self._path.replace(os.sep, '/') + '/'):
+            module = self._name
+        else:
+            module = 'other'
+
+        return self._modules.setdefault(module, {
+            'module': module, 'compilations': 0, 'hits': 0, 'misses': 0,
+            'uncacheable': 0
+            })
+
+
+if __name__ == '__main__':
+
+    log = CacheStatsLog(os.path.join('bin', 'ccache_stats.log'), '.')
+    for entry in log.modules():
+        print('{hit_rate:6.1%}  {compilations:6d}  {module}'.format(**entry))
@@ -0,0 +1,209 @@
+import os
+
+
+class ComponentGraph:
+
+    # component of the files that are not in a component directory
+    core = 'core'
+
+    def __init__(self, graph):
+        """ Split of the compiled sources of a module into components.
+
+        Components follow the NJOY source layout: the files in (and
+        below) a directory src/<module>/<component>/ belong to that
+        component, as does the header src/<module>/<component>.hpp next
+        to the directory.  The other compiled sources belong to the core
+        component.
+
+        A component links the components whose files one of its sources
+        includes, directly or transitively.  Components that end up
+        linking each other are merged, so that the components form a
+        directed acyclic graph.  Only components with compiled sources
+        are part of the split.
+
+        Parameters
+        ----------
+        graph : IncludeGraph
+            The include graph of the source tree.
+
+        """
+
+        self._graph = graph
+        self._tree = graph.tree
+
+        # component directories
+        self._directories = set()
+        for file_ in self._tree.list_compiled_source():
+            parts = file_.split('/')
+            if len(parts) > 3 and parts[0] == 'src':
+                self._directories.add(parts[2])
+
+        # memoized results
+        self._components = None
+        self._links = None
+        self._merged = None
+
+    ###################################################################
+    # Properties
+    ###################################################################
+
+    @property
+    def components(self):
+        """ List of (component, compiled sources) pairs, every component
+        coming after the components it links.
+
+        """
+
+        if self._components is None:
+            self._split()
+
+        return self._components
+
+    ###################################################################
+    # Public functions
+    ###################################################################
+
+    def links(self, component):
+        """ Return the components a component links directly.
+
+        """
+
+        if self._links is None:
+            self._split()
+
+        return self._links[component]
+
+    def used_by(self, files):
+        """ Return the components with files included by the given files
+        (such as the sources of a test), directly or transitively, in
+        the order of the components property.
+
+        """
+
+        if self._merged is None:
+            self._split()
+
+        used = set()
+        for file_ in files:
+            for item in self._graph.closure(file_):
+                key = self._component(item)
+                if key in self._merged:
+                    used.add(self._merged[key])
+
+        return [name for name, _ in self.components if name in used]
+
+    ###################################################################
+    # Private functions
+    ###################################################################
+
+    def _component(self, file_):
+        """ Return the component a file belongs to (None for files outside
+        of the src directory).
+
+        """
+
+        parts = file_.split('/')
+        if parts[0] != 'src':
+            return None
+        if len(parts) < 3:
+            return self.core
+
+        if len(parts) > 3:
+            return parts[2]
+
+        stem = os.path.splitext(parts[2])[0]
+        if stem in self._directories:
+            return stem
+
+        return self.core
+
+    def _split(self):
+        """ Group the compiled sources, infer the links between the
+        groups and merge the groups that link each other.
+
+        """
+
+        sources = {}
+        for file_ in self._tree.list_compiled_source():
+            key = self._component(file_) or self.core
+            sources.setdefault(key, []).append(file_)
+
+        # direct links between components with sources
+        edges = dict((key, set()) for key in sources)
+        for key, files in sources.items():
+            for file_ in files:
+                for item in self._graph.closure(file_):
+                    other = self._component(item)
+                    if other in sources and other != key:
+                        edges[key].add(other)
+
+        # components reaching each other are merged
+        reach = dict((key, _reachable(key, edges)) for key in edges)
+        merged = {}
+        for key in sorted(edges):
+            group = sorted(
+                other for other in edges
+                if other == key or (other in reach[key] and key in reach[other])
+                )
+            merged[key] = '+'.join(group)
+
+        # links of the merged components, in topological order
+        links = {}
+        for key, targets in edges.items():
+            name = merged[key]
+            links.setdefault(name, set())
+            links[name].update(merged[other] for other in targets)
+            links[name].discard(name)
+
+        order = []
+        for name in sorted(links):
+            _visit(name, links, order)
+
+        self._merged = merged
+        self._links = dict(
+            (name, [other for other in order if other in links[name]])
+            for name in order
+            )
+        self._components = [
+            (name, [file_ for file_ in self._tree.list_compiled_source()
+                    if merged[self._component(file_) or self.core] == name])
+            for name in order
+            ]
+
+
+def _visit(name, links, order):
+    """ Append a node to a topological order, after the nodes it links.
+
+    """
+
+    if name in order:
+        return
+    for other in sorted(links[name]):
+        _visit(other, links, order)
+    order.append(name)
+
+
+def _reachable(key, edges):
+    """ Return the set of nodes reachable from a node.
+
+    """
+
+    result = set()
+    pending = list(edges[key])
+    while pending:
+        item = pending.pop()
+        if item not in result:
+            result.add(item)
+            pending.extend(edges[item])
+
+    return result
+
+
+if __name__ == '__main__':
+
+    from .include_graph import IncludeGraph
+    from .njoy_source_tree import NJOYSourceTree
+
+    components = ComponentGraph(IncludeGraph(NJOYSourceTree('test_tree')))
+    for name, sources in components.components:
+        print(name, components.links(name), sources)
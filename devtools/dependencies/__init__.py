@@ -1,3 +1,9 @@
 from .dependency import Dependency
 from .dependencies import Dependencies
 from .release import ReleaseDependencies
+from .git_metadata import GitMetadata, UnsupportedRepository
+from .release_cache import ReleaseCache
+from .graph import DependencyGraph, DependencyCycle
+from .local import LocalDependencies, MirrorCache
+from .archive import ArchiveResolver
+from .partial_fetch import write_partial_fetch_script
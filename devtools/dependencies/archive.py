@@ -0,0 +1,220 @@
+import hashlib
+import json
+import os
+import re
+import shutil
+import subprocess as sp
+import tempfile
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from ..output import write_if_changed
+
+
+class ArchiveResolver:
+
+    def __init__(self, record, cache=None, workers=None):
+        """ Object used to fetch pinned dependencies as source archives
+        rather than Git clones.
+
+        The SHA-256 hash of every archive is computed once and stored in
+        a record file, so that later runs need not download it again.
+        Archives are available for GitHub and GitLab remotes, and for
+        local repositories when an archive cache is used.
+
+        Note: the hash of a hosted archive is only as stable as the
+        archive the hosting service generates.
+
+        Parameters
+        ----------
+        record : str
+            The JSON file recording archive URLs and hashes.
+        cache : str, optional
+            A directory in which downloaded archives are kept.  When
+            given, the generated declarations try the cached archive
+            before the remote one.
+        workers : int, optional
+            The maximum number of concurrent downloads.
+
+        """
+
+        self._record = record
+        self._cache = os.path.abspath(cache) if cache else None
+        self.workers = workers
+
+        self._hashes = {}
+        if os.path.isfile(record):
+            with open(record, 'r') as f:
+                self._hashes = json.load(f)
+
+    ###################################################################
+    # Public functions
+    ###################################################################
+
+    def archive_url(self, remote, ref):
+        """ Return the URL of the source archive of a ref on a hosted
+        remote, or None if the host is not supported.
+
+        """
+
+        match = re.match(r'^https?://(github\.com|gitlab\.com)/(.+?)(\.git)?/*$',
+                         remote)
+        if not match:
+            return None
+
+        host, project = match.group(1), match.group(2)
+        if host == 'github.com':
+            return 'https://github.com/{}/archive/{}.tar.gz'.format(
+                project, ref)
+        else:
+            return 'https://gitlab.com/{0}/-/archive/{1}/{2}-{1}.tar.gz'.format(
+                project, ref, project.split('/')[-1])
+
+    def apply(self, dependencies):
+        """ Switch every pinned dependency (tag or commit) to an archive
+        download.  Live-at-head dependencies and dependencies for which
+        no archive is available keep using Git.
+
+        Returns the list of dependencies that were switched.
+
+        """
+
+        pinned = [
+            d for d in dependencies
+            if not d.live_at_head and self._sources(d)
+            ]
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            results = list(executor.map(self._resolve, pinned))
+
+        for dependency, (urls, sha256) in zip(pinned, results):
+            dependency.urls = urls
+            dependency.url_hash = 'SHA256=' + sha256
+
+        self._save()
+        return pinned
+
+    ###################################################################
+    # Private functions
+    ###################################################################
+
+    def _sources(self, dependency):
+        """ Return the cache path and remote URL of the archive of a
+        dependency.  Either may be None.
+
+        """
+
+        ref = _ref(dependency.tag)
+        url = self.archive_url(dependency.remote, ref)
+
+        # local repositories can only be archived into the cache
+        cached = None
+        if self._cache and (url or _is_local(dependency.remote)):
+            cached = os.path.join(
+                self._cache,
+                '{}-{}.tar.gz'.format(dependency.name, ref)
+                )
+
+        if not url and not cached:
+            return None
+
+        return cached, url
+
+    def _resolve(self, dependency):
+        """ Return the URLs and SHA-256 hash of the archive of a
+        dependency, downloading it if necessary.
+
+        """
+
+        cached, url = self._sources(dependency)
+        key = '{} {}'.format(dependency.remote, _ref(dependency.tag))
+
+        urls = []
+        if cached:
+            if not os.path.isfile(cached):
+                self._download(dependency, url, cached)
+            urls.append('file://' + cached)
+        if url:
+            urls.append(url)
+
+        if key not in self._hashes:
+            if cached:
+                self._hashes[key] = _file_hash(cached)
+            else:
+                with tempfile.TemporaryDirectory() as tmpdir:
+                    filename = os.path.join(tmpdir, 'archive.tar.gz')
+                    self._download(dependency, url, filename)
+                    self._hashes[key] = _file_hash(filename)
+
+        return urls, self._hashes[key]
+
+    def _download(self, dependency, url, filename):
+        """ Download (or, for local repositories, create) the archive of
+        a dependency.
+
+        """
+
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        tmpname = filename + '.part'
+
+        if url:
+            with urllib.request.urlopen(url) as response, \
+                    open(tmpname, 'wb') as f:
+                shutil.copyfileobj(response, f)
+        else:
+            # upload-archive refuses bare commit hashes, so the local
+            # repository is archived directly
+            ref = _ref(dependency.tag)
+            cmd = [
+                'git', 'archive', '--format=tar.gz',
+                '--prefix={}-{}/'.format(dependency.name, ref),
+                '--output={}'.format(tmpname),
+                ref
+                ]
+            p = sp.Popen(cmd, stderr=sp.PIPE, cwd=_local_path(dependency.remote))
+            stderr = p.communicate()[1].decode().strip()
+            if p.returncode != 0:
+                if os.path.exists(tmpname):
+                    os.remove(tmpname)
+                raise Exception(
+                    'Cannot archive {} at {}: {}'
+                    ''.format(dependency.remote, ref, stderr))
+
+        os.replace(tmpname, filename)
+
+    def _save(self):
+
+        write_if_changed(
+            self._record,
+            json.dumps(self._hashes, indent=2, sort_keys=True) + '\n'
+            )
+
+
+def _ref(tag):
+    """ Strip the "# tag: ..." comment of release dependencies.
+
+    """
+
+    return tag.split('#')[0].strip()
+
+
+def _local_path(remote):
+
+    if remote.startswith('file://'):
+        return remote[len('file://'):]
+    return remote
+
+
+def _is_local(remote):
+
+    return os.path.isdir(_local_path(remote))
+
+
+def _file_hash(filename):
+
+    digest = hashlib.sha256()
+    with open(filename, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 16), b''):
+            digest.update(block)
+
+    return digest.hexdigest()
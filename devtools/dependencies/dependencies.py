@@ -1,6 +1,8 @@
+import io
 import os
 from textwrap import dedent
 
+from ..output import write_if_changed
 from .dependency import Dependency
 
 
@@ -44,6 +46,15 @@ class Dependencies:
 
         return self._dependencies
 
+    @property
+    def partial_fetch(self):
+        """ Flag indicating that a dependency is cloned partially or
+        checked out sparsely, which requires git_partial_fetch.cmake.
+
+        """
+
+        return any(dependency.partial_fetch for dependency in self)
+
     ###################################################################
     # Public functions
     ##################################################################
@@ -61,9 +72,12 @@ class Dependencies:
     def cmake_file(self, filename):
         """ Write the dependency information to a CMake file.
 
+        The file is only rewritten if its contents change.  Returns
+        True if the file was written.
+
         """
 
-        f = open(filename, 'w')
+        f = io.StringIO()
 
         # preamble
         f.write(dedent("""\
@@ -98,7 +112,7 @@ class Dependencies:
             f.write('    {}\n'.format(dependency.name))
         f.write('    )\n')
 
-        f.close()
+        return write_if_changed(filename, f.getvalue())
 
 if __name__ == '__main__':
     d1 = Dependency(name='foo')
@@ -11,7 +11,9 @@ class Dependency:
             remote=None,
             branch=None,
             tag=None,
-            setup=None
+            setup=None,
+            partial_clone=None,
+            sparse=None
             ):
         """ Container for a dependency.
 
@@ -20,6 +22,9 @@ class Dependency:
         if tag and branch:
             raise Exception("Must only supply tag or branch, not both.")
 
+        if sparse and any(',' in path for path in sparse):
+            raise Exception("Sparse checkout paths cannot contain commas.")
+
         if not tag and not branch:
             branch = self.default_branch
 
@@ -31,6 +36,17 @@ class Dependency:
 
         # simple attributes
         self.setup = setup
+        self.transitive = False
+
+        # archive download (see ArchiveResolver), used instead of
+        # cloning the repository when set
+        self.urls = []
+        self.url_hash = None
+
+        # partial clone filter (True for a blobless clone) and sparse
+        # checkout directories, carried out by git_partial_fetch.cmake
+        self.partial_clone = partial_clone
+        self.sparse = list(sparse or [])
 
 
     ###################################################################
@@ -126,6 +142,28 @@ class Dependency:
 
         return True if self._branch else False
 
+    @property
+    def clone_filter(self):
+        """ The partial clone filter, e.g. blob:none, or None for a
+        full clone.
+
+        """
+
+        if self.partial_clone is True:
+            return 'blob:none'
+        else:
+            return self.partial_clone or None
+
+    @property
+    def partial_fetch(self):
+        """ Flag indicating that the dependency is cloned partially or
+        checked out sparsely, using the git_partial_fetch.cmake script
+        rather than the FetchContent Git support.
+
+        """
+
+        return bool(self.clone_filter or self.sparse)
+
 
     ###################################################################
     # Public functions
@@ -137,18 +175,42 @@ class Dependency:
 
         """
 
-        result = dedent("""\
-            FetchContent_Declare( {name}
-                GIT_REPOSITORY  {remote}
-                GIT_TAG         {tag}
-            """).format(
-                name=self.name,
-                remote=self.remote,
-                tag=self.tag
-                )
+        if self.urls:
+            result = dedent("""\
+                FetchContent_Declare( {name}
+                    URL             {urls}
+                    URL_HASH        {hash}
+                """).format(
+                    name=self.name,
+                    urls='\n                    '.join(self.urls),
+                    hash=self.url_hash
+                    )
+
+        elif self.partial_fetch:
+            command = self._partial_fetch_command()
+            result = dedent("""\
+                FetchContent_Declare( {name}
+                    DOWNLOAD_COMMAND {command}
+                """).format(name=self.name, command=command)
+
+            # branches are fetched again on every update, as FetchContent
+            # does for Git repositories
+            if self.live_at_head:
+                result += '    UPDATE_COMMAND   {}\n'.format(command)
 
-        if self.live_at_head:
-            result += '    GIT_SHALLOW     TRUE\n'
+        else:
+            result = dedent("""\
+                FetchContent_Declare( {name}
+                    GIT_REPOSITORY  {remote}
+                    GIT_TAG         {tag}
+                """).format(
+                    name=self.name,
+                    remote=self.remote,
+                    tag=self.tag
+                    )
+
+            if self.live_at_head:
+                result += '    GIT_SHALLOW     TRUE\n'
 
         result += '    )\n'
 
@@ -157,6 +219,34 @@ class Dependency:
 
         return result
 
+    ###################################################################
+    # Private functions
+    ###################################################################
+
+    def _partial_fetch_command(self):
+        """ Return the command running git_partial_fetch.cmake for the
+        dependency.  The script is generated in the cmake directory of
+        the top-level project, which declares the dependency first.
+
+        """
+
+        arguments = [
+            '${CMAKE_COMMAND}',
+            '-D GIT_REPOSITORY={}'.format(self.remote),
+            '-D GIT_TAG={}'.format(self.tag)
+            ]
+        if self.clone_filter:
+            arguments.append('-D GIT_FILTER={}'.format(self.clone_filter))
+        if self.sparse:
+            arguments.append(
+                '-D GIT_SPARSE_PATHS={}'.format(','.join(self.sparse)))
+        arguments += [
+            '-D SOURCE_DIR=<SOURCE_DIR>',
+            '-P ${PROJECT_SOURCE_DIR}/cmake/git_partial_fetch.cmake'
+            ]
+
+        return '\n        '.join(arguments)
+
 
 if __name__ == '__main__':
     d1 = Dependency(name='foo')
@@ -0,0 +1,324 @@
+import os
+import re
+import zlib
+
+
+class UnsupportedRepository(Exception):
+    """ Raised when a repository cannot be read without invoking git.
+
+    """
+
+    pass
+
+
+class GitMetadata:
+
+    def __init__(self, path):
+        """ Read-only view of a Git checkout, obtained by parsing the
+        files in its .git directory rather than running git.
+
+        Only plain (non-worktree) repositories using SHA-1 object names
+        and the files ref backend are handled.  Anything else raises an
+        UnsupportedRepository exception, so that the caller can fall
+        back on the git executable.
+
+        Parameters
+        ----------
+        path : str
+            The path to the checked out repository.
+
+        """
+
+        self._path = path
+        self._gitdir = os.path.join(path, '.git')
+
+        # a .git file indicates a linked worktree or a submodule
+        if not os.path.isdir(self._gitdir):
+            raise UnsupportedRepository(
+                '{} is not a plain repository.'.format(path))
+        if os.path.exists(os.path.join(self._gitdir, 'commondir')):
+            raise UnsupportedRepository(
+                '{} is a linked worktree.'.format(path))
+
+        self._config = self._read_config()
+        self._check_format()
+        self._packed_refs, self._peeled = self._read_packed_refs()
+
+    ###################################################################
+    # Properties
+    ###################################################################
+
+    @property
+    def path(self):
+        """ The path to the checked out repository.
+
+        """
+
+        return self._path
+
+    @property
+    def remote(self):
+        """ The fetch URL of the first remote, mirroring the first line
+        of "git remote -v".
+
+        """
+
+        remotes = sorted(
+            subsection for section, subsection in self._config
+            if section == 'remote' and subsection is not None
+            and 'url' in self._config[(section, subsection)]
+            )
+        if not remotes:
+            raise UnsupportedRepository(
+                '{} has no remote.'.format(self._path))
+
+        return self._config[('remote', remotes[0])]['url']
+
+    @property
+    def head(self):
+        """ The commit hash currently checked out.
+
+        """
+
+        return self.resolve('HEAD')
+
+    @property
+    def tags(self):
+        """ Sorted list of the tags pointing at the current commit,
+        mirroring "git tag --points-at HEAD".
+
+        """
+
+        head = self.head
+        tags = []
+        for ref, sha in sorted(self._list_refs('refs/tags/').items()):
+            if sha == head or self._peel(ref, sha) == head:
+                tags.append(ref[len('refs/tags/'):])
+
+        return tags
+
+    ###################################################################
+    # Public functions
+    ###################################################################
+
+    def resolve(self, ref):
+        """ Return the object name a (possibly symbolic) ref points to.
+
+        """
+
+        for _ in range(10):
+            filename = os.path.join(self._gitdir, *ref.split('/'))
+            if os.path.isfile(filename):
+                with open(filename, 'r') as f:
+                    value = f.read().strip()
+            elif ref in self._packed_refs:
+                value = self._packed_refs[ref]
+            else:
+                raise UnsupportedRepository(
+                    'Cannot resolve {} in {}.'.format(ref, self._path))
+
+            if value.startswith('ref:'):
+                ref = value[4:].strip()
+            else:
+                return self._object_name(value)
+
+        raise UnsupportedRepository(
+            'Symbolic ref chain too deep in {}.'.format(self._path))
+
+    ###################################################################
+    # Private functions
+    ###################################################################
+
+    def _read_config(self):
+        """ Parse .git/config into a dictionary keyed on
+        (section, subsection) tuples.  Section and key names are
+        lowercased, as in git.
+
+        """
+
+        config = {}
+        current = None
+        section_re = re.compile(r'^\[\s*([\w.-]+)\s*(?:"((?:[^"\\]|\\.)*)")?\s*\]')
+
+        with open(os.path.join(self._gitdir, 'config'), 'r') as f:
+            for line in f:
+                line = line.strip()
+                if not line or line[0] in '#;':
+                    continue
+
+                match = section_re.match(line)
+                if match:
+                    section, subsection = match.groups()
+                    section = section.lower()
+                    if subsection is None and '.' in section:
+                        section, subsection = section.split('.', 1)
+                    current = config.setdefault((section, subsection), {})
+                    line = line[match.end():].strip()
+                    if not line or line[0] in '#;':
+                        continue
+
+                if current is None:
+                    raise UnsupportedRepository(
+                        'Cannot parse the configuration of {}.'
+                        ''.format(self._path))
+
+                key, _, value = line.partition('=')
+                current[key.strip().lower()] = self._config_value(value)
+
+        return config
+
+    def _config_value(self, value):
+        """ Strip quotes and trailing comments from a config value.
+
+        """
+
+        result = ''
+        quoted = False
+        escaped = False
+        for char in value.strip():
+            if escaped:
+                result += {'n': '\n', 't': '\t'}.get(char, char)
+                escaped = False
+            elif char == '\\':
+                escaped = True
+            elif char == '"':
+                quoted = not quoted
+            elif char in '#;' and not quoted:
+                break
+            else:
+                result += char
+
+        return result.strip()
+
+    def _check_format(self):
+        """ Reject repository formats this reader does not understand.
+
+        """
+
+        sections = set(section for section, _ in self._config)
+        if sections & {'include', 'includeif', 'url'}:
+            raise UnsupportedRepository(
+                '{} uses config includes or URL rewriting.'
+                ''.format(self._path))
+
+        core = self._config.get(('core', None), {})
+        extensions = self._config.get(('extensions', None), {})
+        if int(core.get('repositoryformatversion', '0')) > 1:
+            raise UnsupportedRepository(
+                '{} uses an unknown repository format.'.format(self._path))
+        if extensions.get('objectformat', 'sha1').lower() != 'sha1':
+            raise UnsupportedRepository(
+                '{} uses a non-SHA-1 object format.'.format(self._path))
+        if extensions.get('refstorage', 'files').lower() != 'files':
+            raise UnsupportedRepository(
+                '{} uses a non-file ref storage.'.format(self._path))
+        if extensions.get('worktreeconfig', 'false').lower() == 'true':
+            raise UnsupportedRepository(
+                '{} uses per-worktree configuration.'.format(self._path))
+
+    def _read_packed_refs(self):
+        """ Parse .git/packed-refs, returning the refs and, for
+        annotated tags, the commit they peel to.
+
+        """
+
+        refs = {}
+        peeled = {}
+        filename = os.path.join(self._gitdir, 'packed-refs')
+        if not os.path.isfile(filename):
+            return refs, peeled
+
+        last = None
+        with open(filename, 'r') as f:
+            for line in f:
+                line = line.strip()
+                if not line or line.startswith('#'):
+                    continue
+                if line.startswith('^'):
+                    peeled[last] = self._object_name(line[1:])
+                    continue
+                sha, ref = line.split(None, 1)
+                refs[ref] = self._object_name(sha)
+                last = ref
+
+        return refs, peeled
+
+    def _list_refs(self, prefix):
+        """ Return a dictionary of all refs under prefix, with loose refs
+        taking precedence over packed ones.
+
+        """
+
+        refs = dict(
+            (ref, sha) for ref, sha in self._packed_refs.items()
+            if ref.startswith(prefix)
+            )
+
+        top = os.path.join(self._gitdir, *prefix.rstrip('/').split('/'))
+        for root, dirs, files in os.walk(top):
+            for file_ in files:
+                ref = os.path.relpath(
+                    os.path.join(root, file_), self._gitdir
+                    ).replace(os.sep, '/')
+                with open(os.path.join(root, file_), 'r') as f:
+                    value = f.read().strip()
+                if value.startswith('ref:'):
+                    raise UnsupportedRepository(
+                        'Symbolic tag {} in {}.'.format(ref, self._path))
+                refs[ref] = self._object_name(value)
+
+        return refs
+
+    def _peel(self, ref, sha):
+        """ Return the commit an annotated tag points to, or sha itself
+        for a lightweight tag.
+
+        """
+
+        # the peeled lines of packed-refs only apply to the packed value,
+        # not to a loose ref overriding it
+        if self._packed_refs.get(ref) == sha:
+            if ref in self._peeled:
+                return self._peeled[ref]
+
+            # a packed ref from a fully peeled packed-refs file without a
+            # peeled line is not an annotated tag
+            if self._fully_peeled():
+                return sha
+
+        # otherwise inspect the loose object
+        filename = os.path.join(self._gitdir, 'objects', sha[:2], sha[2:])
+        if not os.path.isfile(filename):
+            raise UnsupportedRepository(
+                'Object {} of {} is packed.'.format(sha, self._path))
+
+        with open(filename, 'rb') as f:
+            data = zlib.decompress(f.read())
+        header, _, body = data.partition(b'\0')
+        kind = header.split()[0]
+        if kind != b'tag':
+            return sha
+
+        target = body.split(b'\n', 1)[0].split()
+        if target[0] != b'object':
+            raise UnsupportedRepository(
+                'Cannot parse tag {} in {}.'.format(ref, self._path))
+        return self._peel(ref + '^', self._object_name(target[1].decode()))
+
+    def _fully_peeled(self):
+
+        filename = os.path.join(self._gitdir, 'packed-refs')
+        with open(filename, 'r') as f:
+            header = f.readline()
+        return header.startswith('#') and 'fully-peeled' in header.split()
+
+    def _object_name(self, value):
+        """ Validate a SHA-1 object name.
+
+        """
+
+        value = value.strip()
+        if not re.match(r'^[0-9a-f]{40}$', value):
+            raise UnsupportedRepository(
+                'Unexpected object name {!r} in {}.'.format(value, self._path))
+        return value
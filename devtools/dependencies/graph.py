@@ -0,0 +1,220 @@
+import copy
+import os
+
+from .dependency import Dependency
+from .dependencies import Dependencies
+
+
+class DependencyCycle(Exception):
+    """ Raised when the dependency registry contains a cycle.
+
+    """
+
+    pass
+
+
+class DependencyGraph:
+
+    def __init__(self, registry):
+        """ Dependency graph over a registry of components, such as the
+        contents of dependencies.json.
+
+        The registry maps a component name to its list of direct
+        dependencies (or to false if it has none).  Components that are
+        not in the registry, typically third-party repositories, are
+        taken to have no dependencies.
+
+        Parameters
+        ----------
+        registry : dict
+            The dependency registry.
+
+        """
+
+        self._registry = registry
+        self._lowercase = dict(
+            (name.lower(), name) for name in registry
+            )
+
+        # memoized results
+        self._direct = {}
+        self._closures = {}
+
+    ###################################################################
+    # Public functions
+    ###################################################################
+
+    def direct(self, component):
+        """ Return the list of direct dependencies of a component as
+        Dependency objects.
+
+        """
+
+        key = self._registry_name(component)
+        if key is None and not isinstance(component, Dependency):
+            raise Exception(
+                '{} is not in the dependency registry.'.format(component))
+
+        if key not in self._direct:
+            entries = (self._registry[key] or []) if key else []
+            self._direct[key] = [_make_dependency(item) for item in entries]
+
+        return self._direct[key]
+
+    def closure(self, component):
+        """ Return the names of all dependencies of a component, direct
+        and transitive, in topological order (every dependency appears
+        before the components depending on it).
+
+        Names are FetchContent names, i.e. lowercase.
+
+        """
+
+        return self._closure(component, ())
+
+    def resolve(self, component):
+        """ Return a Dependencies object with the flattened, topologically
+        ordered and de-duplicated dependencies of a component.
+
+        When a dependency is specified differently by several components,
+        the specification closest to the component wins, as it would with
+        nested FetchContent declarations.  Dependencies that are not
+        direct dependencies of the component are flagged as transitive.
+
+        """
+
+        chosen = self._choose(component)[0]
+        direct = set(_key(d) for d in self.direct(component))
+
+        result = Dependencies()
+        for key in self.closure(component):
+            dependency = copy.copy(chosen[key])
+            dependency.transitive = key not in direct
+            result.add_dependencies(dependency)
+
+        return result
+
+    def conflicts(self, component):
+        """ Return a list of conflicting dependency specifications found
+        while resolving a component.
+
+        Each conflict is a tuple of the dependency name, the component
+        whose specification was used, the specification itself, the
+        component whose specification was ignored and the ignored
+        specification.  Specifications are (remote, tag) pairs.
+
+        """
+
+        return self._choose(component)[1]
+
+    ###################################################################
+    # Private functions
+    ###################################################################
+
+    def _registry_name(self, component):
+        """ Return the registry entry for a component or Dependency, or
+        None if it is not registered.
+
+        """
+
+        if isinstance(component, Dependency):
+            candidates = [component.name, os.path.basename(component.remote)]
+        else:
+            candidates = [component]
+
+        for name in candidates:
+            if name in self._registry:
+                return name
+            if name.lower() in self._lowercase:
+                return self._lowercase[name.lower()]
+
+        return None
+
+    def _closure(self, component, path):
+
+        key = self._registry_name(component)
+        if key in self._closures:
+            return self._closures[key]
+
+        name = key if key else component.name
+        if name in path:
+            cycle = path[path.index(name):] + (name,)
+            raise DependencyCycle(
+                'Dependency cycle: {}'.format(' -> '.join(cycle)))
+
+        result = []
+        seen = set()
+        for dependency in self.direct(component):
+            for item in self._closure(dependency, path + (name,)) + \
+                    (_key(dependency),):
+                if item not in seen:
+                    seen.add(item)
+                    result.append(item)
+
+        result = tuple(result)
+        if key is not None:
+            self._closures[key] = result
+
+        return result
+
+    def _choose(self, component):
+        """ Select the specification of every dependency in a breadth-first
+        traversal and record the conflicts encountered.
+
+        """
+
+        chosen = {}
+        origin = {}
+        conflicts = []
+
+        queue = [(component, d) for d in self.direct(component)]
+        while queue:
+            parent, dependency = queue.pop(0)
+            key = _key(dependency)
+
+            if key in chosen:
+                if _spec(chosen[key]) != _spec(dependency):
+                    conflict = (
+                        dependency.name,
+                        origin[key],
+                        _spec(chosen[key]),
+                        parent,
+                        _spec(dependency)
+                        )
+                    if conflict not in conflicts:
+                        conflicts.append(conflict)
+                continue
+
+            chosen[key] = dependency
+            origin[key] = parent
+            queue.extend(
+                (dependency.name, d) for d in self.direct(dependency)
+                )
+
+        return chosen, conflicts
+
+
+def _make_dependency(item):
+    """ Create a Dependency from a registry entry.
+
+    """
+
+    if isinstance(item, str):
+        return Dependency(name=item)
+    elif isinstance(item, dict):
+        return Dependency(**item)
+    else:
+        raise Exception('%r is an invalid dependency.' % item)
+
+
+def _key(dependency):
+    """ The name FetchContent uses for a dependency.
+
+    """
+
+    return dependency.name.lower()
+
+
+def _spec(dependency):
+
+    return (dependency.remote, dependency.tag)
@@ -0,0 +1,142 @@
+import copy
+import os
+import re
+import subprocess as sp
+from concurrent.futures import ThreadPoolExecutor
+
+from .dependencies import Dependencies
+
+
+class MirrorCache:
+
+    def __init__(self, directory, workers=None):
+        """ Shared directory of bare Git mirrors of dependency remotes.
+
+        Parameters
+        ----------
+        directory : str
+            The directory holding the mirrors.  It is created if needed.
+        workers : int, optional
+            The maximum number of mirrors cloned or updated concurrently.
+            If not given, the default of ThreadPoolExecutor is used.
+
+        """
+
+        self._directory = os.path.abspath(directory)
+        self.workers = workers
+
+    ###################################################################
+    # Properties
+    ###################################################################
+
+    @property
+    def directory(self):
+        """ The directory holding the mirrors.
+
+        """
+
+        return self._directory
+
+    ###################################################################
+    # Public functions
+    ###################################################################
+
+    def mirror_path(self, remote):
+        """ Return the path of the mirror of a remote.
+
+        The path mirrors the host and path of the remote URL, e.g.
+        https://github.com/njoy/ENDFtk is mirrored in
+        <directory>/github.com/njoy/ENDFtk.git.
+
+        """
+
+        # strip the scheme, user information and .git suffix
+        location = re.sub(r'^[a-zA-Z][\w+.-]*://', '', remote)
+        location = re.sub(r'^[^/@]+@', '', location)
+        location = re.sub(r'(\.git)?/*$', '', location)
+
+        parts = [
+            part for part in re.split(r'[/:\\]+', location)
+            if part and part not in ('.', '..')
+            ]
+
+        return os.path.join(self._directory, *parts) + '.git'
+
+    def mirror_url(self, remote):
+        """ Return the file:// URL of the mirror of a remote.
+
+        A URL rather than a plain path is used so that shallow clones
+        are honoured.
+
+        """
+
+        return 'file://' + self.mirror_path(remote)
+
+    def update(self, remotes):
+        """ Clone or update the mirrors of the given remotes.
+
+        Returns a list of (remote, error) pairs, where error is None if
+        the mirror was updated successfully.
+
+        """
+
+        remotes = sorted(set(remotes))
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            errors = list(executor.map(self._update_one, remotes))
+
+        return list(zip(remotes, errors))
+
+    ###################################################################
+    # Private functions
+    ###################################################################
+
+    def _update_one(self, remote):
+
+        path = self.mirror_path(remote)
+        if os.path.isdir(path):
+            cmd = ['git', 'remote', 'update', '--prune']
+            cwd = path
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # serve partial clones (see Dependency.partial_clone)
+            cmd = ['git', 'clone', '--mirror', '--quiet',
+                   '--config', 'uploadpack.allowFilter=true', remote, path]
+            cwd = None
+
+        p = sp.Popen(cmd, stdout=sp.PIPE, stderr=sp.PIPE, cwd=cwd)
+        stderr = p.communicate()[1].decode().strip()
+        if p.returncode != 0:
+            return stderr or 'git exited with status {}'.format(p.returncode)
+
+        return None
+
+
+class LocalDependencies(Dependencies):
+
+    def __init__(self, dependencies, mirrors):
+        """ Dependencies fetched from a shared cache of local mirrors
+        rather than from their remotes.
+
+        Parameters
+        ----------
+        dependencies : iterable of Dependency
+            The dependencies to fetch, usually the develop dependencies.
+        mirrors : MirrorCache
+            The mirror cache.  Every dependency must have been mirrored.
+
+        """
+
+        # call parent constructor
+        Dependencies.__init__(self)
+
+        for dependency in dependencies:
+            path = mirrors.mirror_path(dependency.remote)
+            if not os.path.isdir(path):
+                raise Exception(
+                    'No local mirror of {} in {}.'
+                    ''.format(dependency.remote, mirrors.directory))
+
+            local = copy.copy(dependency)
+            local.name = dependency.name
+            local.remote = mirrors.mirror_url(dependency.remote)
+            self.add_dependencies(local)
@@ -0,0 +1,70 @@
+from textwrap import dedent
+
+from ..output import write_if_changed
+
+
+def write_partial_fetch_script(filename):
+    """ Write the CMake script used as the download (and update) step of
+    dependencies that are cloned partially or checked out sparsely.
+
+    The script clones the repository without checking it out, using the
+    partial clone filter if any, restricts the checkout to the sparse
+    directories if any (in cone mode, so that the files at the top of
+    the repository are always checked out), and then checks out the
+    requested tag.  When the repository was already cloned, it is
+    fetched again instead, so the script is also the update step.
+
+    The file is only rewritten if its contents change.  Returns True if
+    the file was written.
+
+    """
+
+    return write_if_changed(filename, dedent("""\
+        # Clone a dependency partially and/or check it out sparsely
+        #
+        #   cmake -D GIT_REPOSITORY=<url> -D GIT_TAG=<ref> -D SOURCE_DIR=<dir>
+        #         [-D GIT_FILTER=<filter>] [-D GIT_SPARSE_PATHS=<dir>,<dir>,...]
+        #         -P git_partial_fetch.cmake
+
+        cmake_minimum_required( VERSION 3.14 )
+        find_package( Git REQUIRED )
+
+        function( run_git )
+            execute_process(
+                COMMAND ${GIT_EXECUTABLE} ${ARGN}
+                WORKING_DIRECTORY ${SOURCE_DIR}
+                RESULT_VARIABLE result
+                )
+            if( NOT result EQUAL 0 )
+                message( FATAL_ERROR "git ${ARGN} failed in ${SOURCE_DIR}" )
+            endif()
+        endfunction()
+
+        if( NOT EXISTS ${SOURCE_DIR}/.git )
+            # remove whatever a failed attempt left behind
+            file( REMOVE_RECURSE ${SOURCE_DIR} )
+            file( MAKE_DIRECTORY ${SOURCE_DIR} )
+            if( GIT_FILTER )
+                run_git( clone --no-checkout --filter=${GIT_FILTER}
+                         ${GIT_REPOSITORY} . )
+            else()
+                run_git( clone --no-checkout ${GIT_REPOSITORY} . )
+            endif()
+        else()
+            run_git( fetch --tags --force origin )
+        endif()
+
+        if( GIT_SPARSE_PATHS )
+            string( REPLACE "," ";" paths "${GIT_SPARSE_PATHS}" )
+            run_git( sparse-checkout init --cone )
+            run_git( sparse-checkout set ${paths} )
+        elseif( EXISTS ${SOURCE_DIR}/.git/info/sparse-checkout )
+            run_git( sparse-checkout disable )
+        endif()
+
+        run_git( checkout --quiet --force --detach ${GIT_TAG} )
+        """))
+
+
+if __name__ == '__main__':
+    write_partial_fetch_script('git_partial_fetch.cmake')
@@ -1,13 +1,19 @@
 import os
 import subprocess as sp
+from concurrent.futures import ThreadPoolExecutor
 
 from .dependency import Dependency
 from .dependencies import Dependencies
+from .git_metadata import GitMetadata, UnsupportedRepository
+from .release_cache import ReleaseCache, fingerprint
 
 
 class ReleaseDependencies(Dependencies):
 
-    def __init__(self, path):
+    backends = ('git', 'metadata')
+
+    def __init__(self, path, workers=None, backend='git', cache=None,
+                 invalidate=False):
         """ Object used to create dependencies for a release based on the
         currently checked out versions of the dependencies.
 
@@ -19,12 +25,34 @@ class ReleaseDependencies(Dependencies):
         path : str
             The path to FetchContent's collection of repositories, usually
             "_deps" in the build folder.
+        workers : int, optional
+            The maximum number of repositories queried concurrently.  If
+            not given, the default of ThreadPoolExecutor is used.
+        backend : str, optional
+            How the checkouts are queried: "git" runs the git executable,
+            "metadata" reads the .git directory directly and only runs
+            git for repositories it cannot handle.
+        cache : str, optional
+            A JSON file in which resolved dependencies are cached.  Only
+            checkouts whose Git state changed since the last run are
+            queried again.  If not given, no cache is used.
+        invalidate : bool, optional
+            Discard the contents of the cache before resolving.
 
         """
 
+        if backend not in self.backends:
+            raise Exception('Unknown release backend {!r}.'.format(backend))
+
         # call parent constructor
         Dependencies.__init__(self)
 
+        # options
+        self.workers = workers
+        self.backend = backend
+        self.cache = cache
+        self.invalidate = invalidate
+
         # automatically add dependencies
         self._register_existing(path)
 
@@ -34,64 +62,132 @@ class ReleaseDependencies(Dependencies):
 
     def _register_existing(self, path):
 
-        toplevel = os.getcwd()
-        os.chdir(path)
+        directories = [
+            os.path.join(path, dir_)
+            for dir_ in sorted(os.listdir(path))
+            if dir_.endswith('-src')
+            ]
+
+        # look up unchanged checkouts in the cache
+        resolved = [None] * len(directories)
+        if self.cache:
+            cache = ReleaseCache(self.cache)
+            if self.invalidate:
+                cache.invalidate()
+            fingerprints = [fingerprint(dir_) for dir_ in directories]
+            resolved = [
+                cache.lookup(dir_, fp)
+                for dir_, fp in zip(directories, fingerprints)
+                ]
+
+        # the git queries are I/O bound, so a thread pool suffices;
+        # map preserves the (sorted) order of the directories
+        changed = [i for i, item in enumerate(resolved) if item is None]
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            queried = executor.map(
+                self._resolve,
+                [directories[i] for i in changed]
+                )
+            for i, item in zip(changed, queried):
+                resolved[i] = item
 
-        for dir_ in sorted(os.listdir(os.getcwd())):
-            if not dir_.endswith('-src'):
-                continue
+        # update the cache
+        if self.cache:
+            for i in changed:
+                cache.store(directories[i], fingerprints[i], resolved[i])
+            cache.prune(directories)
+            cache.save()
 
-            # enter directory
-            os.chdir(dir_)
+        for name, remote, commit, tag in resolved:
 
-            # name from FetchContent
-            # unfortunately, case information is lost
-            fname = dir_[:-4]
+            # construct commit/tag pair
+            if tag:
+                commit += ' # tag: {}'.format(tag)
 
-            # get remote information
-            cmd = ['git', 'remote', '-v']
-            p = sp.Popen(cmd, stdout=sp.PIPE) 
-            remote = p.communicate()[0].decode().strip()
-            remote = remote.split()[1]
+            # register dependency
+            self.add_dependencies(
+                Dependency(
+                    name=name,
+                    remote=remote,
+                    tag=commit
+                    )
+                )
 
-            # name from remote
-            # not always the same as name used in the build system
-            rname = remote.split('/')[-1]
+    def _resolve(self, path):
+        """ Return the name, remote, commit and tag of the repository
+        checked out in path.
 
-            # resolve names
-            if fname == rname.lower():
-                name = rname
-            else:
-                name = fname
+        """
 
-            # query git tag
-            cmd = ['git', 'tag', '--points-at', 'HEAD']
-            p = sp.Popen(cmd, stdout=sp.PIPE)
-            tag = p.communicate()[0].decode().strip()
-            if tag:
-                tag = tag.split('\n')[0]
+        # name from FetchContent
+        # unfortunately, case information is lost
+        fname = os.path.basename(path)[:-4]
 
-            # query git commit
-            cmd = ['git', 'rev-parse', 'HEAD']
-            p = sp.Popen(cmd, stdout=sp.PIPE)
-            commit = p.communicate()[0].decode().strip()
+        # query remote, commit and tag
+        if self.backend == 'metadata':
+            remote, commit, tag = _query_metadata(path)
+        else:
+            remote, commit, tag = _query_git(path)
 
-            # construct commit/tag pair
-            if tag:
-                commit += ' # tag: {}'.format(tag)
+        # name from remote
+        # not always the same as name used in the build system
+        rname = remote.split('/')[-1]
 
-            # register dependency
-            dep = Dependency(
-                name=name,
-                remote=remote,
-                tag=commit
-                )
-            self.add_dependencies(dep)
+        # resolve names
+        if fname == rname.lower():
+            name = rname
+        else:
+            name = fname
+
+        return name, remote, commit, tag
+
+
+def _query_git(path):
+    """ Return the remote, commit and first tag (if any) of the
+    repository at path using the git executable.
+
+    """
+
+    # get remote information
+    remote = _git(path, 'remote', '-v')
+    remote = remote.split()[1]
+
+    # query git tag
+    tag = _git(path, 'tag', '--points-at', 'HEAD')
+    if tag:
+        tag = tag.split('\n')[0]
+
+    # query git commit
+    commit = _git(path, 'rev-parse', 'HEAD')
+
+    return remote, commit, tag
+
+
+def _query_metadata(path):
+    """ Return the remote, commit and first tag (if any) of the
+    repository at path by reading its .git directory, falling back on
+    the git executable when that is not possible.
+
+    """
+
+    try:
+        repo = GitMetadata(path)
+        tags = repo.tags
+        return repo.remote, repo.head, tags[0] if tags else ''
+
+    except UnsupportedRepository:
+        return _query_git(path)
+
+
+def _git(path, *args):
+    """ Run a git command in the repository at path and return its
+    output.
 
-            # return from directory
-            os.chdir('..')
+    """
 
-        os.chdir(toplevel)
+    cmd = ['git'] + list(args)
+    p = sp.Popen(cmd, stdout=sp.PIPE, cwd=path)
+    return p.communicate()[0].decode().strip()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,181 @@
+import hashlib
+import json
+import os
+
+
+class ReleaseCache:
+
+    def __init__(self, filename):
+        """ Persistent cache of resolved release dependencies.
+
+        Entries are stored per checkout directory together with a
+        fingerprint of the checkout's Git state, so a checkout only has
+        to be queried again once its HEAD, refs or configuration change.
+
+        Parameters
+        ----------
+        filename : str
+            The JSON file holding the cache, usually in the build folder.
+
+        """
+
+        self._filename = filename
+        self._entries = {}
+        self._modified = False
+
+        if os.path.isfile(filename):
+            try:
+                with open(filename, 'r') as f:
+                    self._entries = self._check_entries(json.load(f))
+            except ValueError:
+                # a corrupt cache is simply rebuilt
+                self._entries = {}
+
+    ###################################################################
+    # Properties
+    ###################################################################
+
+    @property
+    def filename(self):
+        """ The JSON file holding the cache.
+
+        """
+
+        return self._filename
+
+    ###################################################################
+    # Public functions
+    ###################################################################
+
+    def lookup(self, path, fingerprint):
+        """ Return the cached (name, remote, commit, tag) tuple for the
+        checkout at path, or None if the fingerprint does not match.
+
+        """
+
+        entry = self._entries.get(os.path.basename(path))
+        if entry and entry['fingerprint'] == fingerprint:
+            return tuple(entry['resolved'])
+
+        return None
+
+    def store(self, path, fingerprint, resolved):
+        """ Record the (name, remote, commit, tag) tuple for the
+        checkout at path.
+
+        """
+
+        self._entries[os.path.basename(path)] = {
+            'fingerprint': fingerprint,
+            'resolved': list(resolved)
+            }
+        self._modified = True
+
+    def prune(self, paths):
+        """ Remove entries for checkouts other than those in paths.
+
+        """
+
+        keep = set(os.path.basename(path) for path in paths)
+        for key in list(self._entries):
+            if key not in keep:
+                del self._entries[key]
+                self._modified = True
+
+    def invalidate(self):
+        """ Discard all cached entries.
+
+        """
+
+        self._entries = {}
+        self._modified = True
+
+    def save(self):
+        """ Write the cache to disk if it was modified.
+
+        """
+
+        if not self._modified:
+            return
+
+        tmpname = self._filename + '.tmp'
+        with open(tmpname, 'w') as f:
+            json.dump(self._entries, f, indent=2, sort_keys=True)
+        os.replace(tmpname, self._filename)
+        self._modified = False
+
+    ###################################################################
+    # Private functions
+    ###################################################################
+
+    def _check_entries(self, entries):
+        """ Return the well-formed entries of a loaded cache.  A cache of
+        another shape (e.g. written by another version) yields no
+        entries, so that it is rebuilt.
+
+        """
+
+        if not isinstance(entries, dict):
+            return {}
+
+        return dict(
+            (key, entry) for key, entry in entries.items()
+            if isinstance(entry, dict)
+            and isinstance(entry.get('fingerprint'), str)
+            and isinstance(entry.get('resolved'), list)
+            and len(entry['resolved']) == 4
+            )
+
+
+def fingerprint(path):
+    """ Return a cheap fingerprint of the Git state of the checkout at
+    path.
+
+    The fingerprint covers the modification times of the repository
+    configuration, HEAD and packed-refs, the contents of HEAD and of the
+    loose ref it points to, and the loose tags.  No Git objects are read.
+
+    """
+
+    gitdir = os.path.join(path, '.git')
+    digest = hashlib.sha1()
+
+    def add_file(filename, contents=False):
+        try:
+            stat = os.stat(filename)
+        except OSError:
+            digest.update(b'-\0')
+            return
+        digest.update('{} {}\0'.format(stat.st_mtime_ns, stat.st_size).encode())
+        if contents:
+            with open(filename, 'rb') as f:
+                digest.update(f.read() + b'\0')
+
+    # a .git file (worktree or submodule) is only fingerprinted by
+    # itself; such checkouts are rare in _deps
+    if not os.path.isdir(gitdir):
+        add_file(gitdir, contents=True)
+        return digest.hexdigest()
+
+    add_file(os.path.join(gitdir, 'config'))
+    add_file(os.path.join(gitdir, 'packed-refs'))
+
+    head = os.path.join(gitdir, 'HEAD')
+    add_file(head, contents=True)
+    try:
+        with open(head, 'r') as f:
+            value = f.read().strip()
+    except OSError:
+        value = ''
+    if value.startswith('ref:'):
+        ref = value[4:].strip()
+        add_file(os.path.join(gitdir, *ref.split('/')), contents=True)
+
+    for root, dirs, files in os.walk(os.path.join(gitdir, 'refs', 'tags')):
+        dirs.sort()
+        for file_ in sorted(files):
+            digest.update(os.path.relpath(
+                os.path.join(root, file_), gitdir).encode() + b'\0')
+            add_file(os.path.join(root, file_), contents=True)
+
+    return digest.hexdigest()
@@ -0,0 +1,101 @@
+from . import output
+
+
+def header_costs(graph):
+    """ Estimate the compile-time cost of every header of a source tree.
+
+    For every header, the following are determined:
+
+    translation_units
+        The number of translation units (compiled sources and test
+        sources) including the header, directly or transitively.
+    test_executables
+        The number of test directories with a source including the
+        header, directly or transitively.
+    includers
+        The number of files including the header directly.
+    size
+        The size of the header, in bytes.
+    closure_files
+        The number of repository files the header includes, directly or
+        transitively.
+    closure_size
+        The size of the header and everything it includes, in bytes.
+    parse_cost
+        The estimated number of bytes parsed because of the header over
+        a full build: translation_units times closure_size.
+
+    Only files within the repository are part of the include graph, so
+    the sizes do not account for system and dependency headers.
+
+    Parameters
+    ----------
+    graph : IncludeGraph
+        The include graph of the source tree.
+
+    Returns
+    -------
+    list of dictionaries, most expensive first
+
+    """
+
+    tree = graph.tree
+    units = set(graph.translation_units())
+
+    # test directory of every test source
+    owners = {}
+    for dir_ in tree.list_test_directories():
+        for file_ in tree.list_test_files(dir_):
+            owners[file_] = dir_
+
+    # files including each file directly
+    includers = dict((f, 0) for f in graph.files)
+    for file_ in graph.files:
+        for included in graph.includes(file_):
+            includers[included] += 1
+
+    costs = []
+    for header in tree.list_header_files():
+        dependents = graph.dependents(header)
+        count = len(dependents & units)
+        closure_size = graph.closure_size(header)
+        costs.append({
+            'header': header,
+            'translation_units': count,
+            'test_executables': len(set(
+                owners[f] for f in dependents if f in owners)),
+            'includers': includers.get(header, 0),
+            'size': graph.size(header),
+            'closure_files': len(graph.closure(header)),
+            'closure_size': closure_size,
+            'parse_cost': count * closure_size
+            })
+
+    costs.sort(key=lambda item: (-item['parse_cost'], item['header']))
+    return costs
+
+
+def format_table(costs, count=None):
+    """ Return a text table of the most expensive headers.
+
+    """
+
+    columns = (
+        ('parse_cost', 'parse cost'),
+        ('translation_units', 'units'),
+        ('test_executables', 'tests'),
+        ('includers', 'includers'),
+        ('closure_size', 'closure'),
+        ('size', 'size')
+        )
+
+    return output.format_table(costs, columns, ('header', 'header'), count)
+
+
+if __name__ == '__main__':
+
+    from .include_graph import IncludeGraph
+    from .njoy_source_tree import NJOYSourceTree
+
+    graph = IncludeGraph(NJOYSourceTree('test_tree'))
+    print(format_table(header_costs(graph), 20), end='')
@@ -0,0 +1,271 @@
+import json
+import os
+import re
+import time
+
+
+class IncludeGraph:
+
+    # matches both #include "file" and #include <file>
+    include_re = re.compile(
+        r'^[ \t]*#[ \t]*include[ \t]*[<"]([^>"\n]+)[>"]',
+        re.MULTILINE
+        )
+
+    # version of the cache format
+    cache_version = 1
+
+    # files modified less than this many seconds before a build are
+    # parsed again on the next build (see NJOYSourceTree.racy_interval)
+    racy_interval = 2.0
+
+    def __init__(self, tree, cache=None):
+        """ Graph of the #include directives between the files of an NJOY
+        source tree.
+
+        Every compiled source, header and test source is parsed.  An
+        include is resolved relative to the including file and then
+        relative to the src directory; includes that cannot be resolved
+        to a file in the repository (system and dependency headers) are
+        not part of the graph.
+
+        Parameters
+        ----------
+        tree : NJOYSourceTree
+            The source tree.
+        cache : str, optional
+            A JSON file recording the modification time, size and include
+            directives of every file.  When given, only files whose
+            modification time or size changed since the previous build
+            are parsed again.
+
+        """
+
+        self._tree = tree
+        self._cache = cache
+        self._includes = {}
+        self._sizes = {}
+        self._closures = {}
+        self._dependents = None
+        self._cached = {}
+        self._parsed = {}
+        self._started = None
+
+        self._build()
+
+    ###################################################################
+    # Properties
+    ###################################################################
+
+    @property
+    def tree(self):
+        """ The NJOYSourceTree the graph was built from.
+
+        """
+
+        return self._tree
+
+    @property
+    def files(self):
+        """ Sorted list of all files in the graph, relative to the module
+        path.
+
+        """
+
+        return sorted(self._includes)
+
+    ###################################################################
+    # Public functions
+    ###################################################################
+
+    def includes(self, file_):
+        """ Return the files directly included by a file.
+
+        """
+
+        return self._includes[file_]
+
+    def closure(self, file_):
+        """ Return the set of files a file includes, directly or
+        transitively (not including the file itself).
+
+        """
+
+        if file_ not in self._closures:
+            result = set()
+            pending = list(self._includes[file_])
+            while pending:
+                item = pending.pop()
+                if item in result:
+                    continue
+                result.add(item)
+                if item in self._closures:
+                    result |= self._closures[item]
+                else:
+                    pending.extend(self._includes[item])
+            result.discard(file_)
+            self._closures[file_] = frozenset(result)
+
+        return self._closures[file_]
+
+    def dependents(self, file_):
+        """ Return the set of files including a file, directly or
+        transitively.
+
+        """
+
+        if self._dependents is None:
+            self._dependents = dict((f, set()) for f in self._includes)
+            for item in self._includes:
+                for included in self.closure(item):
+                    self._dependents[included].add(item)
+
+        return self._dependents.get(file_, set())
+
+    def size(self, file_):
+        """ Size of a file, in bytes.
+
+        """
+
+        return self._sizes[file_]
+
+    def closure_size(self, file_):
+        """ Size of a file and everything it includes, in bytes.
+
+        """
+
+        return self.size(file_) + sum(self.size(f) for f in self.closure(file_))
+
+    def translation_units(self):
+        """ Return the list of compiled sources and test sources.
+
+        """
+
+        units = list(self._tree.list_compiled_source())
+        for dir_ in self._tree.list_test_directories():
+            units.extend(self._tree.list_test_files(dir_))
+
+        return units
+
+    ###################################################################
+    # Private functions
+    ###################################################################
+
+    def _build(self):
+
+        self._cached = self._load_cache()
+        self._started = time.time()
+
+        pending = self.translation_units() + list(self._tree.list_header_files())
+        while pending:
+            file_ = pending.pop()
+            if file_ in self._includes:
+                continue
+
+            self._includes[file_] = self._parse(file_)
+            pending.extend(self._includes[file_])
+
+        self._save_cache()
+
+    def _parse(self, file_):
+        """ Return the sorted list of files included by a file that can
+        be resolved within the repository.
+
+        The include directives of a file are taken from the cache if the
+        file did not change.  They are resolved again in any case, since
+        files may have been added or removed.
+
+        """
+
+        filename = os.path.join(self._tree.path, file_)
+        stat = os.stat(filename)
+
+        entry = self._cached.get(file_)
+        if entry is None or entry['mtime'] != stat.st_mtime_ns or \
+                entry['bytes'] != stat.st_size:
+            with open(filename, 'r', errors='replace') as f:
+                contents = f.read()
+            entry = {
+                'mtime': stat.st_mtime_ns,
+                'bytes': stat.st_size,
+                'size': len(contents),
+                'includes': [
+                    include.strip()
+                    for include in self.include_re.findall(contents)
+                    ]
+                }
+
+        # do not trust entries that might still change within the mtime
+        # resolution of the file system
+        if stat.st_mtime_ns / 1e9 < self._started - self.racy_interval:
+            self._parsed[file_] = entry
+
+        self._sizes[file_] = entry['size']
+
+        result = set()
+        for include in entry['includes']:
+            resolved = self._resolve(file_, include)
+            if resolved:
+                result.add(resolved)
+
+        return sorted(result)
+
+    def _load_cache(self):
+        """ Return the file entries of the cache, or an empty dictionary
+        if there is no usable cache.
+
+        """
+
+        if not self._cache or not os.path.isfile(self._cache):
+            return {}
+
+        try:
+            with open(self._cache, 'r') as f:
+                cache = json.load(f)
+        except ValueError:
+            return {}
+
+        if cache.get('version') != self.cache_version:
+            return {}
+        if cache.get('path') != os.path.abspath(self._tree.path):
+            return {}
+
+        return cache['files']
+
+    def _save_cache(self):
+        """ Write the file entries to the cache, if they changed.
+
+        """
+
+        if not self._cache or self._parsed == self._cached:
+            return
+
+        cache = {
+            'version': self.cache_version,
+            'path': os.path.abspath(self._tree.path),
+            'files': self._parsed
+            }
+
+        directory = os.path.dirname(self._cache)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        tmpname = self._cache + '.tmp'
+        with open(tmpname, 'w') as f:
+            json.dump(cache, f, sort_keys=True)
+        os.replace(tmpname, self._cache)
+
+    def _resolve(self, file_, include):
+        """ Resolve an include relative to the including file, then
+        relative to the src directory.
+
+        """
+
+        for directory in (os.path.dirname(file_), 'src'):
+            candidate = os.path.normpath(os.path.join(directory, include))
+            if candidate.startswith('..'):
+                continue
+            if os.path.isfile(os.path.join(self._tree.path, candidate)):
+                return candidate
+
+        return None
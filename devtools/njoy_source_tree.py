@@ -1,11 +1,43 @@
+import json
 import os
+import re
 import sys
 import shutil
+import time
 
 
 class NJOYSourceTree:
 
-    def __init__(self, path):
+    # version of the manifest format
+    manifest_version = 2
+
+    # directories modified less than this many seconds before a scan
+    # are listed again on the next scan, since a coarse mtime resolution
+    # could hide later changes
+    racy_interval = 2.0
+
+    # Catch test macros and their statically known names
+    test_macro_re = re.compile(
+        r'\b(TEST_CASE|SCENARIO|TEST_CASE_METHOD|TEMPLATE_TEST_CASE\w*|'
+        r'TEMPLATE_PRODUCT_TEST_CASE\w*|TEMPLATE_LIST_TEST_CASE\w*|'
+        r'METHOD_AS_TEST_CASE|REGISTER_TEST_CASE)\s*\('
+        )
+    test_name_re = re.compile(
+        r'\b(TEST_CASE|SCENARIO)\s*\(\s*"((?:[^"\\]|\\.)*)"\s*[,)]|'
+        r'\bTEST_CASE_METHOD\s*\(\s*[\w:<>, ]+?\s*,\s*"((?:[^"\\]|\\.)*)"'
+        )
+    catch_main_re = re.compile(
+        r'^[ \t]*#[ \t]*define[ \t]+CATCH_CONFIG_(MAIN|RUNNER)\b',
+        re.MULTILINE
+        )
+
+    # string literals naming a data file, outside preprocessor lines
+    preprocessor_re = re.compile(r'^[ \t]*#[^\n]*', re.MULTILINE)
+    data_file_re = re.compile(
+        r'"((?:[\w.+-]+/)*[\w+-]+(?:\.[\w+-]+)*\.[A-Za-z]\w*)"'
+        )
+
+    def __init__(self, path, manifest=None, rescan=False):
         """ Object containing information about the source tree for an
         NJOY module.
 
@@ -15,13 +47,29 @@ class NJOYSourceTree:
         files.  Will be extended to support Fortran modules and (once
         a pattern is established) Python bindings.
 
+        Parameters
+        ----------
+        path : str
+            The top-level path to the module.
+        manifest : str, optional
+            A JSON file recording the modification time and contents of
+            every directory under src.  When given, only directories
+            whose modification time changed since the previous scan are
+            listed again.
+        rescan : bool, optional
+            Ignore the contents of the manifest and list every directory.
+
         """
 
         # initialize variables
         self._path = path
+        self._manifest = manifest
+        self._rescan = rescan
         self._test_directories = []
         self._compiled_source = []
         self._header_files = []
+        self._test_files = {}
+        self._test_sources = {}
 
         # execute functionality
         self._traverse()
@@ -86,34 +134,128 @@ class NJOYSourceTree:
             return self._test_directories
 
 
+    def list_test_files(self, directory, absolute=False):
+        """ Return a sorted list of the source files in a test directory,
+        as given by list_test_directories.
+
+        """
+
+        if absolute:
+            return self._relative_to_absolute(self._test_files[directory])
+        else:
+            return self._test_files[directory]
+
+
+    def test_source_info(self, file_):
+        """ Return information on the Catch usage of a test source, as a
+        dictionary with the following keys:
+
+        main : str or None
+            "MAIN" or "RUNNER" if the file defines CATCH_CONFIG_MAIN or
+            CATCH_CONFIG_RUNNER.
+        cases : list of str
+            The names of the test cases defined in the file, in order.
+            Scenario names include the "Scenario: " prefix, as in Catch.
+        static : bool
+            True if every test case name could be determined statically.
+        files : list of str
+            The data files named by string literals in the file, in
+            sorted order.
+        symbols : list of str
+            The qualified names of the functions and variables defined
+            at namespace scope with external linkage (e.g. "::chunk"),
+            in sorted order.  These clash when the file is linked with
+            another one defining the same names.
+
+        The file is only read once.
+
+        """
+
+        if file_ not in self._test_sources:
+            filename = os.path.join(self._path, file_)
+            with open(filename, 'r', errors='replace') as f:
+                contents = _strip_comments(f.read())
+
+            main = self.catch_main_re.search(contents)
+            cases = []
+            for match in self.test_name_re.finditer(contents):
+                macro, name, method_name = match.groups()
+                if macro == 'SCENARIO':
+                    cases.append('Scenario: ' + _unescape(name))
+                elif macro:
+                    cases.append(_unescape(name))
+                else:
+                    cases.append(_unescape(method_name))
+
+            self._test_sources[file_] = {
+                'main': main.group(1) if main else None,
+                'cases': cases,
+                'static': len(cases) == len(
+                    self.test_macro_re.findall(contents)),
+                'files': sorted(set(self.data_file_re.findall(
+                    self.preprocessor_re.sub('', contents)))),
+                'symbols': _external_definitions(
+                    self.preprocessor_re.sub('', contents))
+                }
+
+        return self._test_sources[file_]
+
+
     ###################################################################
     # Private functions
     ###################################################################
 
     def _traverse(self):
 
-        # use os.walk to traverse source tree
-        for root, dirs, files in os.walk(os.path.join(self._path, 'src')):
-
-            # find test directories
-            for dir_ in dirs:
-                if dir_ == 'test':
-                    self._test_directories.append(
-                        os.path.relpath(
-                            os.path.join(root, dir_),
-                            start=self._path
-                            )
-                        )
-
-            # exclude test directories from walk
-            dirs[:] = [d for d in dirs if d != 'test']
+        cached = self._load_manifest()
+        scanned = {}
+        started = time.time()
+
+        def lookup(root, list_directory):
+            """ Return the entry of a directory, reusing the manifest
+            entry if the directory did not change.
+
+            """
+
+            try:
+                mtime = os.stat(os.path.join(self._path, root)).st_mtime_ns
+            except OSError:
+                return None
+
+            entry = cached.get(root)
+            if entry is None or entry['mtime'] != mtime:
+                entry = list_directory(root)
+                entry['mtime'] = mtime
+
+            # do not trust entries that might still change within the
+            # mtime resolution of the file system
+            if mtime / 1e9 < started - self.racy_interval:
+                scanned[root] = entry
+
+            return entry
+
+        # walk the source tree in a single pass, collecting the test
+        # sources along the way
+        pending = ['src']
+        while pending:
+            root = pending.pop()
+            entry = lookup(root, self._list_directory)
+            if entry is None:
+                continue
+
+            # find test directories and their source files
+            for dir_ in entry['tests']:
+                test_directory = os.path.join(root, dir_)
+                test_entry = lookup(test_directory, self._list_test_directory)
+                self._test_directories.append(test_directory)
+                self._test_files[test_directory] = [
+                    os.path.join(test_directory, file_)
+                    for file_ in (test_entry['files'] if test_entry else [])
+                    ]
 
             # find source/header files
-            for file_ in files:
-                relpath = os.path.relpath(
-                    os.path.join(root, file_),
-                    start=self._path
-                    )
+            for file_ in entry['files']:
+                relpath = os.path.join(root, file_)
 
                 if file_.endswith('.cpp'):
                     self._compiled_source.append(relpath)
@@ -121,11 +263,100 @@ class NJOYSourceTree:
                 elif file_.endswith('.hpp'):
                     self._header_files.append(relpath)
 
+            # descend into subdirectories, excluding test directories
+            pending.extend(os.path.join(root, dir_) for dir_ in entry['dirs'])
+
+        self._save_manifest(scanned)
+
         # sort
         self._header_files.sort()
         self._compiled_source.sort()
         self._test_directories.sort()
 
+    def _list_directory(self, root):
+        """ List the subdirectories and source/header files of a
+        directory relative to the module path.
+
+        Mirrors os.walk: symbolic links to directories are reported but
+        not descended into.  The type information cached by os.scandir
+        avoids a stat call per entry on most platforms.
+
+        """
+
+        entry = {'dirs': [], 'tests': [], 'files': []}
+
+        with os.scandir(os.path.join(self._path, root)) as it:
+            for item in it:
+                if item.is_dir():
+                    if item.name == 'test':
+                        entry['tests'].append(item.name)
+                    elif not item.is_symlink():
+                        entry['dirs'].append(item.name)
+
+                elif item.name.endswith(('.cpp', '.hpp')):
+                    entry['files'].append(item.name)
+
+        entry['dirs'].sort()
+        entry['files'].sort()
+        return entry
+
+    def _list_test_directory(self, root):
+        """ List the source files of a test directory relative to the
+        module path, in sorted order.
+
+        """
+
+        with os.scandir(os.path.join(self._path, root)) as it:
+            files = sorted(
+                item.name for item in it
+                if item.name.endswith('.cpp') and item.is_file()
+                )
+
+        return {'files': files}
+
+    def _load_manifest(self):
+        """ Return the directory entries of the manifest, or an empty
+        dictionary if there is no usable manifest.
+
+        """
+
+        if not self._manifest or self._rescan:
+            return {}
+        if not os.path.isfile(self._manifest):
+            return {}
+
+        try:
+            with open(self._manifest, 'r') as f:
+                manifest = json.load(f)
+        except ValueError:
+            return {}
+
+        if manifest.get('version') != self.manifest_version:
+            return {}
+        if manifest.get('path') != os.path.abspath(self._path):
+            return {}
+
+        return manifest['directories']
+
+    def _save_manifest(self, directories):
+        """ Write the directory entries to the manifest.
+
+        """
+
+        if not self._manifest:
+            return
+
+        manifest = {
+            'version': self.manifest_version,
+            'path': os.path.abspath(self._path),
+            'directories': directories
+            }
+
+        tmpname = self._manifest + '.tmp'
+        with open(tmpname, 'w') as f:
+            json.dump(manifest, f, sort_keys=True)
+        os.replace(tmpname, self._manifest)
+
     def _relative_to_absolute(self, relpaths):
 
         convert = lambda x: os.path.abspath(
@@ -135,6 +366,173 @@ class NJOYSourceTree:
         return [convert(path) for path in relpaths]
 
 
+def _strip_comments(contents):
+    """ Remove C and C++ comments, leaving string literals intact.
+
+    """
+
+    pattern = re.compile(
+        r'//[^\n]*|/\*.*?\*/|("(?:[^"\\\n]|\\.)*")',
+        re.DOTALL
+        )
+    return pattern.sub(
+        lambda m: m.group(1) if m.group(1) else ' ',
+        contents
+        )
+
+
+# keywords of namespace scope statements that do not define a function or
+# variable with external linkage
+_internal_keywords = {
+    'static', 'inline', 'constexpr', 'template', 'typedef', 'using',
+    'extern', 'friend', 'operator', 'class', 'struct', 'union', 'enum',
+    'static_assert'
+    }
+
+
+def _external_definitions(contents):
+    """ Return the sorted qualified names of the functions and variables
+    defined with external linkage at namespace scope in C++ code without
+    comments or preprocessor lines.
+
+    This is a heuristic: static, inline, constexpr and template entities,
+    const variables and anything in an anonymous namespace are skipped,
+    as are statements starting with a single identifier and parentheses
+    (such as Catch test case macros).
+
+    """
+
+    tokens = re.findall(
+        r'"(?:[^"\\\n]|\\.)*"|\'(?:[^\'\\\n]|\\.)*\'|::|[A-Za-z_]\w*|\S',
+        contents
+        )
+
+    names = set()
+    scopes = []        # (namespace name or None, external)
+    statement = []
+    skip = False       # skipping the rest of a statement after braces
+    depth = 0          # nesting of braces other than namespaces
+
+    def record(name):
+        if name and all(flag for _, flag in scopes):
+            names.add('::'.join([''] + [n for n, _ in scopes] + [name]))
+
+    for token in tokens:
+        if depth:
+            if token == '{':
+                depth += 1
+            elif token == '}':
+                depth -= 1
+            continue
+
+        if token == '{':
+            if statement[:1] == ['namespace'] or \
+                    statement[:2] == ['inline', 'namespace']:
+                name = statement[-1] if statement[-1] != 'namespace' else None
+                scopes.append((name, name is not None))
+                statement = []
+                continue
+            if statement[:1] == ['extern'] and len(statement) == 2:
+                # extern "C" block
+                scopes.append((None, True))
+                statement = []
+                continue
+
+            if not skip:
+                if _parameters(statement):
+                    # function definition
+                    record(_declarator(statement[:statement.index('(')]))
+                    statement = []
+                else:
+                    # class definition or variable with an initializer
+                    record(_variable(statement))
+                    skip = True
+            depth = 1
+        elif token == '}':
+            if scopes:
+                scopes.pop()
+            statement = []
+            skip = False
+        elif token == ';':
+            # function declarations are harmless
+            if not skip and not _parameters(statement):
+                record(_variable(statement))
+            statement = []
+            skip = False
+        elif not skip:
+            statement.append(token)
+
+    return sorted(names)
+
+
+def _parameters(statement):
+    """ Check whether a statement declares a function, i.e. has
+    parentheses before any initializer.
+
+    """
+
+    if '(' not in statement:
+        return False
+
+    return '=' not in statement[:statement.index('(')]
+
+
+def _variable(statement):
+    """ Return the name of the variable defined by a namespace scope
+    statement, if any, unless it is const.
+
+    """
+
+    if '=' in statement:
+        statement = statement[:statement.index('=')]
+    if '[' in statement:
+        statement = statement[:statement.index('[')]
+    if not statement:
+        return None
+
+    # a const object (not a pointer to const) has internal linkage
+    if 'const' in statement:
+        after = statement[len(statement) - statement[::-1].index('const'):]
+        if '*' not in after:
+            return None
+
+    return _declarator(statement)
+
+
+def _declarator(statement):
+    """ Return the (possibly qualified) name declared by the tokens of a
+    statement preceding its parameters or initializer, provided a type
+    precedes it and the statement does not declare an entity without
+    external linkage.
+
+    """
+
+    if len(statement) < 2 or not re.match(r'[A-Za-z_]', statement[-1]):
+        return None
+
+    name = statement[-1]
+    position = len(statement) - 1
+    while position >= 2 and statement[position - 1] == '::':
+        name = statement[position - 2] + '::' + name
+        position -= 2
+    if position < 1 or _internal_keywords & set(statement):
+        return None
+
+    return name
+
+
+def _unescape(literal):
+    """ Resolve the simple escape sequences of a C++ string literal.
+
+    """
+
+    return re.sub(
+        r'\\(.)',
+        lambda m: {'n': '\n', 't': '\t'}.get(m.group(1), m.group(1)),
+        literal
+        )
+
+
 if __name__ == '__main__':
 
     tree = NJOYSourceTree('test_tree')
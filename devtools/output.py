@@ -0,0 +1,99 @@
+import hashlib
+import os
+import tempfile
+
+
+def content_hash(content):
+    """ Return the SHA-256 digest of a string or bytes object.
+
+    """
+
+    if isinstance(content, str):
+        content = content.encode()
+
+    return hashlib.sha256(content).hexdigest()
+
+
+def file_hash(filename):
+    """ Return the SHA-256 digest of a file, or None if it does not
+    exist.
+
+    """
+
+    if not os.path.isfile(filename):
+        return None
+
+    with open(filename, 'rb') as f:
+        return content_hash(f.read())
+
+
+def write_if_changed(filename, content):
+    """ Write content to filename, but only if it differs from what is
+    already on disk.
+
+    The file is written atomically (to a temporary file that is then
+    renamed), so unchanged files keep their modification time and
+    readers never see a partially written file.  Returns True if the
+    file was written.
+
+    """
+
+    if file_hash(filename) == content_hash(content):
+        return False
+
+    directory = os.path.dirname(os.path.abspath(filename))
+    fd, tmpname = tempfile.mkstemp(
+        dir=directory,
+        prefix='.' + os.path.basename(filename) + '.',
+        suffix='.tmp'
+        )
+    try:
+        with os.fdopen(fd, 'w') as f:
+            f.write(content)
+        if os.path.exists(filename):
+            os.chmod(tmpname, os.stat(filename).st_mode & 0o777)
+        else:
+            os.chmod(tmpname, 0o666 & ~_umask())
+        os.replace(tmpname, filename)
+    except BaseException:
+        os.unlink(tmpname)
+        raise
+
+    return True
+
+
+def format_table(rows, columns, label, count=None):
+    """ Return a text table of the first count rows (dictionaries).
+
+    Columns are given as (key, title) pairs and right aligned, with
+    floating point values shown with three decimals.  The label column
+    (a (key, title) pair) comes last and is left aligned.
+
+    """
+
+    def cell(value):
+        if isinstance(value, float):
+            return '{:.3f}'.format(value)
+        return str(value)
+
+    rows = rows[:count] if count else rows
+    widths = [max([len(title)] + [len(cell(row[key])) for row in rows])
+              for key, title in columns]
+
+    lines = ['  '.join(title.rjust(width)
+                       for (_, title), width in zip(columns, widths))
+             + '  ' + label[1]]
+    for row in rows:
+        lines.append(
+            '  '.join(cell(row[key]).rjust(width)
+                      for (key, _), width in zip(columns, widths))
+            + '  ' + row[label[0]])
+
+    return '\n'.join(lines) + '\n'
+
+
+def _umask():
+
+    mask = os.umask(0)
+    os.umask(mask)
+    return mask
@@ -0,0 +1,78 @@
+def rank_headers(graph):
+    """ Rank the headers of a source tree as precompiled header
+    candidates.
+
+    A header's score is its fan-in (the number of translation units,
+    compiled sources and test sources alike, that include it directly or
+    transitively) times its transitive size (the size of the header and
+    everything it includes).  Headers included by fewer than two
+    translation units are not candidates.
+
+    Parameters
+    ----------
+    graph : IncludeGraph
+        The include graph of the source tree.
+
+    Returns
+    -------
+    list of (header, fan-in, transitive size) tuples, best first
+
+    """
+
+    fan_in = dict((h, 0) for h in graph.tree.list_header_files())
+    for unit in graph.translation_units():
+        for header in graph.closure(unit):
+            if header in fan_in:
+                fan_in[header] += 1
+
+    ranking = [
+        (header, count, graph.closure_size(header))
+        for header, count in fan_in.items()
+        if count > 1
+        ]
+    ranking.sort(key=lambda item: (-item[1] * item[2], item[0]))
+
+    return ranking
+
+
+def select_precompiled_headers(graph, limit):
+    """ Select the headers to precompile.
+
+    Headers are taken in order of their rank until the combined size of
+    the selected headers and everything they include would exceed the
+    limit.  Headers already included by a selected header are skipped.
+
+    Parameters
+    ----------
+    graph : IncludeGraph
+        The include graph of the source tree.
+    limit : int
+        The maximum combined size, in bytes.
+
+    Returns
+    -------
+    list of headers
+
+    """
+
+    selected = []
+    covered = set()
+    size = 0
+
+    for header, _, _ in rank_headers(graph):
+        if header in covered:
+            continue
+
+        added = set([header]) | graph.closure(header)
+        added -= covered
+        extra = sum(graph.size(f) for f in added)
+        if size + extra > limit:
+            continue
+
+        selected.append(header)
+        covered |= added
+        size += extra
+
+    # headers included by a header selected later are redundant
+    return [h for h in selected
+            if not any(h in graph.closure(other) for other in selected)]
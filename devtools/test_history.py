@@ -0,0 +1,122 @@
+import glob
+import os
+import re
+
+
+class TestHistory:
+
+    # per test timing kept by CTest for scheduling
+    cost_data = os.path.join('Testing', 'Temporary', 'CTestCostData.txt')
+
+    # the log of the last CTest run, which also records test times
+    last_test_logs = os.path.join('Testing', 'Temporary', 'LastTest*.log')
+    log_test_re = re.compile(r'^\d+/\d+ Testing: (.+)$')
+    log_time_re = re.compile(r'^Test time =\s*([0-9.]+) sec')
+
+    def __init__(self, build_dir):
+        """ Timing of previous CTest runs in a build directory.
+
+        The average test times recorded by CTest in CTestCostData.txt
+        are used when present.  Otherwise, the test times are taken from
+        the most recent LastTest log.  A build directory without either
+        file gives an empty history.
+
+        Parameters
+        ----------
+        build_dir : str
+            The CMake build directory in which the tests were run.
+
+        """
+
+        self._build_dir = build_dir
+        self._costs = {}
+
+        if not self._read_cost_data():
+            self._read_last_test_log()
+
+    ###################################################################
+    # Properties
+    ###################################################################
+
+    @property
+    def costs(self):
+        """ Dictionary of the test times (in seconds) by test name.
+
+        """
+
+        return self._costs
+
+    ###################################################################
+    # Public functions
+    ###################################################################
+
+    def cost(self, name):
+        """ Return the time (in seconds) of a test, or None if the test
+        has no recorded time.
+
+        """
+
+        return self._costs.get(name)
+
+    ###################################################################
+    # Private functions
+    ###################################################################
+
+    def _read_cost_data(self):
+        """ Read CTestCostData.txt: lines of "name runs cost", followed
+        by a "---" line and the names of the failed tests (which are not
+        needed here).  Returns False if the file does not exist.
+
+        """
+
+        filename = os.path.join(self._build_dir, self.cost_data)
+        if not os.path.isfile(filename):
+            return False
+
+        with open(filename, 'r', errors='replace') as f:
+            lines = f.read().splitlines()
+
+        for line in lines:
+            if line.strip() == '---':
+                break
+
+            fields = line.rsplit(' ', 2)
+            if len(fields) != 3:
+                continue
+            try:
+                self._costs[fields[0]] = float(fields[2])
+            except ValueError:
+                continue
+
+        return True
+
+    def _read_last_test_log(self):
+        """ Read the test times from the most recent LastTest log.
+
+        """
+
+        logs = glob.glob(os.path.join(self._build_dir, self.last_test_logs))
+        if not logs:
+            return
+
+        with open(max(logs, key=os.path.getmtime), 'r',
+                  errors='replace') as f:
+            lines = f.read().splitlines()
+
+        name = None
+        for line in lines:
+            match = self.log_test_re.match(line)
+            if match:
+                name = match.group(1)
+                continue
+
+            match = self.log_time_re.match(line)
+            if match and name is not None:
+                self._costs[name] = float(match.group(1))
+
+
+if __name__ == '__main__':
+
+    history = TestHistory('bin')
+    for name, cost in sorted(history.costs.items(), key=lambda x: -x[1]):
+        print('{:10.2f}  {}'.format(cost, name))
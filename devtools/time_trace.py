@@ -0,0 +1,270 @@
+import json
+import os
+import re
+
+from . import output
+
+
+class TimeTraceReport:
+
+    # the CMake object directory of a target in a build directory
+    object_dir_re = re.compile(r'(^|/)CMakeFiles/[^/]+\.dir/')
+
+    # sources of a dependency fetched with FetchContent
+    dependency_re = re.compile(r'/_deps/([^/]+)-src/')
+
+    # template instantiation events
+    instantiations = ('InstantiateClass', 'InstantiateFunction')
+
+    def __init__(self, tree, build_dir):
+        """ Aggregate of the clang -ftime-trace profiles in a build
+        directory.
+
+        Every profile (a JSON file written next to an object file) is
+        mapped back to the source it was compiled from.  The time spent
+        in every translation unit is attributed to the test directory it
+        belongs to, the time spent parsing headers to the headers of the
+        source tree (or, for headers of dependencies, to the dependency),
+        and the time spent instantiating templates to the templates.
+
+        Header parse times are inclusive: they contain the time spent
+        parsing the headers they include.  Headers of a dependency
+        included by another header of the same dependency, and nested
+        template instantiations, are only counted in the outermost one.
+
+        Parameters
+        ----------
+        tree : NJOYSourceTree
+            The source tree.
+        build_dir : str
+            The CMake build directory.
+
+        """
+
+        self._tree = tree
+        self._build_dir = build_dir
+        self._units = {}
+        self._headers = {}
+        self._templates = {}
+
+        # test directory of every test source
+        self._owners = {}
+        for dir_ in tree.list_test_directories():
+            for file_ in tree.list_test_files(dir_):
+                self._owners[file_] = dir_
+
+        self._read()
+
+    ###################################################################
+    # Properties
+    ###################################################################
+
+    @property
+    def units(self):
+        """ Dictionary giving, for every translation unit (relative to
+        the module path), its frontend, backend, template instantiation
+        and total time in seconds.
+
+        """
+
+        return self._units
+
+    ###################################################################
+    # Public functions
+    ###################################################################
+
+    def test_directories(self):
+        """ Return the time spent compiling every test directory, as a
+        list of dictionaries with the directory, the number of
+        translation units and their frontend, backend, template
+        instantiation and total time, worst first.
+
+        Translation units that are not test sources are attributed to
+        the library, listed as "src".
+
+        """
+
+        result = {}
+        for unit, times in self._units.items():
+            dir_ = self._owners.get(unit, 'src')
+            entry = result.setdefault(dir_, {
+                'directory': dir_, 'units': 0, 'frontend': 0.,
+                'backend': 0., 'instantiation': 0., 'total': 0.
+                })
+            entry['units'] += 1
+            for key in ('frontend', 'backend', 'instantiation', 'total'):
+                entry[key] += times[key]
+
+        return _ranked(result.values())
+
+    def headers(self):
+        """ Return the time spent parsing every header, as a list of
+        dictionaries with the header, the number of translation units
+        parsing it and the total parse time, worst first.
+
+        """
+
+        return _ranked(self._headers.values())
+
+    def templates(self):
+        """ Return the time spent instantiating every template, as a
+        list of dictionaries with the template, the number of
+        instantiations and their total time, worst first.
+
+        """
+
+        return _ranked(self._templates.values())
+
+    ###################################################################
+    # Private functions
+    ###################################################################
+
+    def _read(self):
+        """ Read every time trace in the build directory.
+
+        """
+
+        for root, dirs, files in os.walk(self._build_dir):
+            dirs[:] = [d for d in dirs if d not in ('_deps', 'Testing')]
+            for file_ in files:
+                if file_.endswith('.json'):
+                    self._read_trace(os.path.join(root, file_))
+
+    def _read_trace(self, filename):
+        """ Read one time trace, ignoring JSON files that are not time
+        traces or were not written for an object file.
+
+        """
+
+        relpath = os.path.relpath(filename, self._build_dir)
+        relpath = relpath.replace(os.sep, '/')
+        if not self.object_dir_re.search(relpath):
+            return
+
+        try:
+            with open(filename, 'r') as f:
+                trace = json.load(f)
+        except ValueError:
+            return
+        if not isinstance(trace, dict) or 'traceEvents' not in trace:
+            return
+
+        # the source the object was compiled from: the path of the trace
+        # without the object directory and the .json extension
+        unit = self.object_dir_re.sub(r'\1', relpath, count=1)[:-5]
+
+        times = {'frontend': 0., 'backend': 0., 'instantiation': 0.,
+                 'total': 0.}
+        sources = []
+        instantiations = []
+        for event in trace['traceEvents']:
+            if event.get('ph') != 'X' or 'dur' not in event:
+                continue
+
+            name = event.get('name')
+            seconds = event['dur'] * 1e-6
+            detail = event.get('args', {}).get('detail', '')
+
+            if name == 'Frontend':
+                times['frontend'] += seconds
+            elif name == 'Backend':
+                times['backend'] += seconds
+            elif name == 'ExecuteCompiler':
+                times['total'] += seconds
+            elif name == 'Source':
+                header = self._header(detail)
+                if header:
+                    sources.append(
+                        (event.get('tid'), event['ts'], -event['dur'], header))
+            elif name in self.instantiations:
+                instantiations.append(
+                    (event.get('tid'), event['ts'], event['dur'], detail))
+
+        # headers within a header of the same name are not counted
+        stack = []
+        for tid, start, duration, header in sorted(sources):
+            while stack and (stack[-1][0] != tid or stack[-1][1] <= start):
+                stack.pop()
+            if not any(item[2] == header for item in stack):
+                entry = self._headers.setdefault(
+                    header, {'header': header, 'count': 0, 'total': 0.})
+                entry['count'] += 1
+                entry['total'] -= duration * 1e-6
+            stack.append((tid, start - duration, header))
+
+        # only count the outermost instantiations
+        end = {}
+        for tid, start, duration, detail in sorted(instantiations):
+            if start < end.get(tid, -1):
+                continue
+            end[tid] = start + duration
+            times['instantiation'] += duration * 1e-6
+            entry = self._templates.setdefault(
+                detail, {'template': detail, 'count': 0, 'total': 0.})
+            entry['count'] += 1
+            entry['total'] += duration * 1e-6
+
+        self._units[unit] = times
+
+    def _header(self, filename):
+        """ Return the header of the source tree, or the dependency, a
+        parsed file is attributed to (None for other files).
+
+        """
+
+        path = os.path.abspath(os.path.join(self._build_dir, filename))
+        relpath = os.path.relpath(path, os.path.abspath(self._tree.path))
+
+        match = self.dependency_re.search(path.replace(os.sep, '/'))
+        if match:
+            return '{} (dependency)'.format(match.group(1))
+        elif not relpath.startswith('..'):
+            return relpath.replace(os.sep, '/')
+
+        return None
+
+
+def _ranked(entries):
+    """ Sort entries by decreasing total time.
+
+    """
+
+    return sorted(entries, key=lambda item: -item['total'])
+
+
+def format_report(report, count=None):
+    """ Return text tables of the test directories, headers and
+    templates taking the most time.
+
+    """
+
+    result = output.format_table(
+        report.test_directories(),
+        (('total', 'total'), ('frontend', 'frontend'),
+         ('backend', 'backend'), ('instantiation', 'templates'),
+         ('units', 'units')),
+        ('directory', 'test directory'),
+        count
+        )
+    result += '\n' + output.format_table(
+        report.headers(),
+        (('total', 'parse time'), ('count', 'units')),
+        ('header', 'header'),
+        count
+        )
+    result += '\n' + output.format_table(
+        report.templates(),
+        (('total', 'time'), ('count', 'count')),
+        ('template', 'template'),
+        count
+        )
+
+    return result
+
+
+if __name__ == '__main__':
+
+    from .njoy_source_tree import NJOYSourceTree
+
+    report = TimeTraceReport(NJOYSourceTree('test_tree'), 'bin')
+    print(format_report(report, 20), end='')
@@ -0,0 +1,276 @@
+import io
+import os
+from textwrap import dedent
+
+from .dependencies import Dependencies, DependencyGraph, \
+                          write_partial_fetch_script
+from .output import write_if_changed
+
+
+class Workspace:
+
+    def __init__(self, path, components, registry, name=None):
+        """ Superbuild of several NJOY modules checked out side by side.
+
+        The superbuild is a single CMake project adding every component
+        once, from its local checkout, and declaring the dependencies of
+        all components once, so that every dependency is fetched and
+        compiled once for the whole workspace.  Since FetchContent keeps
+        the first declaration of every dependency, the declarations made
+        by the components themselves are then ignored.
+
+        Parameters
+        ----------
+        path : str
+            The workspace directory, in which the CMakeLists.txt file of
+            the superbuild is written.
+        components : list of BuildSystem
+            The modules of the workspace.
+        registry : dict
+            The dependency registry, such as the contents of
+            dependencies.json.
+        name : str, optional
+            The name of the superbuild project, derived from the basename
+            of the path by default.
+
+        """
+
+        self._path = path
+        self._name = name
+        self._components = list(components)
+        self._registry = registry
+        self._graph = DependencyGraph(registry)
+        self._registered = set(key.lower() for key in registry)
+
+        # memoized results
+        self._dependencies = None
+        self._conflicts = None
+
+    ###################################################################
+    # Properties
+    ###################################################################
+
+    @property
+    def path(self):
+        """ The workspace directory.
+
+        """
+
+        return self._path
+
+    @property
+    def name(self):
+        """ The name of the superbuild project.
+
+        """
+
+        if self._name:
+            return self._name
+        else:
+            return os.path.basename(os.path.abspath(self._path))
+
+    ###################################################################
+    # Public functions
+    ###################################################################
+
+    def components(self):
+        """ Return the components in topological order: every component
+        comes after the components it depends on.
+
+        """
+
+        keys = dict((c.name.lower(), c) for c in self._components)
+
+        result = []
+        for component in self._components:
+            for key in self._closure(component) + (component.name.lower(),):
+                if key in keys and keys[key] not in result:
+                    result.append(keys[key])
+
+        return result
+
+    def dependencies(self):
+        """ Return a Dependencies object with the dependencies of all
+        components that are not components themselves.
+
+        Each component's dependencies are resolved as for that component
+        alone; when components specify a dependency differently, the
+        component coming first in topological order wins.
+
+        """
+
+        if self._dependencies is None:
+            self._resolve()
+
+        return self._dependencies
+
+    def conflicts(self):
+        """ Return the list of dependencies specified differently by two
+        components, as tuples of the dependency name, the component
+        whose specification was used, the specification, the component
+        whose specification was ignored and that specification.
+        Specifications are (remote, tag) pairs.
+
+        """
+
+        if self._conflicts is None:
+            self._resolve()
+
+        return self._conflicts
+
+    def write_cmakelists(self):
+        """ Write the CMakeLists.txt file of the superbuild, and the
+        scripts it uses.  Returns True if a file was written.
+
+        """
+
+        f = io.StringIO()
+
+        # preamble, setup
+        f.write(dedent("""\
+            ########################################################################
+            # Preamble
+            ########################################################################
+
+            cmake_minimum_required( VERSION 3.14 )
+            project( {0} LANGUAGES CXX )
+
+
+            ########################################################################
+            # Workspace-wide setup
+            ########################################################################
+
+            set( FETCHCONTENT_BASE_DIR "${{CMAKE_BINARY_DIR}}/_deps"
+                CACHE PATH
+                "Directory in which the dependencies of the workspace are fetched"
+                )
+            set( REPOSITORIES "develop"
+                CACHE STRING
+                "Options for where to fetch repositories: develop, release, local"
+                )
+            include( FetchContent )
+
+
+            ########################################################################
+            # Workspace components
+            ########################################################################
+
+            """.format(self.name))
+            )
+
+        components = self.components()
+        for component in components:
+            source = os.path.relpath(
+                os.path.abspath(component.path),
+                os.path.abspath(self._path)
+                ).replace(os.sep, '/')
+            f.write(dedent("""\
+                FetchContent_Declare( {0}
+                    SOURCE_DIR      ${{CMAKE_CURRENT_SOURCE_DIR}}/{1}
+                    )
+
+                """.format(component.name, source))
+                )
+
+        # dependencies
+        dependencies = self.dependencies()
+        if dependencies:
+            f.write(dedent("""\
+
+                ########################################################################
+                # Dependencies
+                ########################################################################
+
+                """)
+                )
+            for dependency in dependencies:
+                f.write(dependency.fetchcontent_declare() + '\n')
+
+        # add every component once, after the components it depends on
+        f.write(dedent("""\
+
+            ########################################################################
+            # Load components
+            ########################################################################
+
+            """)
+            )
+        for component in components:
+            f.write(dedent("""\
+                if( NOT TARGET {0} )
+                    FetchContent_MakeAvailable( {0} )
+                endif()
+                """.format(component.name))
+                )
+
+        changed = write_if_changed(
+            os.path.join(self._path, 'CMakeLists.txt'),
+            f.getvalue()
+            )
+
+        # download step of partially cloned or sparse dependencies
+        if dependencies.partial_fetch:
+            os.makedirs(os.path.join(self._path, 'cmake'), exist_ok=True)
+            changed |= write_partial_fetch_script(
+                os.path.join(self._path, 'cmake', 'git_partial_fetch.cmake'))
+
+        return changed
+
+    ###################################################################
+    # Private functions
+    ###################################################################
+
+    def _closure(self, component):
+        """ Return the (lowercase) names of the dependencies of a
+        component, in topological order.  Components that are not in the
+        registry have no dependencies.
+
+        """
+
+        if component.name.lower() not in self._registered:
+            return ()
+
+        return self._graph.closure(component.name)
+
+    def _resolve(self):
+        """ Select the specification of every dependency, in topological
+        order of the components.
+
+        """
+
+        keys = set(c.name.lower() for c in self._components)
+        chosen = {}
+        origin = {}
+        conflicts = []
+
+        self._dependencies = Dependencies()
+        for component in self.components():
+            if component.name.lower() not in self._registered:
+                continue
+
+            for dependency in self._graph.resolve(component.name):
+                key = dependency.name.lower()
+                if key in keys:
+                    continue
+
+                spec = (dependency.remote, dependency.tag)
+                if key in chosen:
+                    if chosen[key] != spec:
+                        conflicts.append((dependency.name, origin[key],
+                                          chosen[key], component.name, spec))
+                    continue
+
+                chosen[key] = spec
+                origin[key] = component.name
+                self._dependencies.add_dependencies(dependency)
+
+        self._conflicts = conflicts
+
+
+if __name__ == '__main__':
+
+    from .build_system import BuildSystem
+
+    components = [BuildSystem(path) for path in ('ENDFtk', 'thermr')]
+    workspace = Workspace('.', components, {'thermr': ['ENDFtk']})
+    workspace.write_cmakelists()
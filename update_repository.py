@@ -1,11 +1,20 @@
 # system imports
 import argparse
+import copy
 import json
 import os
+import sys
+import traceback
+from concurrent.futures import ProcessPoolExecutor
 
 # local imports
 import devtools.build_system as build
-from devtools.dependencies import ReleaseDependencies, Dependency
+from devtools.change_impact import read_changed_files
+from devtools.test_history import TestHistory
+from devtools.workspace import Workspace
+from devtools.dependencies import ReleaseDependencies, Dependency, \
+                                 DependencyGraph, LocalDependencies, \
+                                 MirrorCache, ArchiveResolver
 
 
 def main():
@@ -13,8 +22,17 @@ def main():
     # parse input arguments
     args = process_input()
 
-    # make the build system
-    make_build_system(args)
+    # make the build system(s)
+    if len(args.repositories) == 1:
+        make_build_system(args)
+    else:
+        results = make_build_systems(args)
+        if not report(results):
+            sys.exit(1)
+
+    # make the workspace superbuild
+    if args.superbuild:
+        make_superbuild(args)
 
 
 def process_input():
@@ -27,11 +45,31 @@ def process_input():
                     'in the NJOY framework.'
         )
 
-    # required input
+    # repositories
     parser.add_argument(
         'path',
         type=str,
-        help='path to repository'
+        nargs='*',
+        help='path(s) to repository'
+        )
+    parser.add_argument(
+        '--workspace', '-w',
+        type=str,
+        help='JSON manifest listing repository paths',
+        default=None
+        )
+    parser.add_argument(
+        '--superbuild',
+        action='store_true',
+        help='also write a superbuild CMakeLists.txt next to the workspace '
+             'manifest, sharing the dependencies of all repositories',
+        default=False
+        )
+    parser.add_argument(
+        '--processes', '-p',
+        type=int,
+        help='number of repositories processed in parallel',
+        default=None
         )
 
     # optional inputs
@@ -59,6 +97,214 @@ def process_input():
         help='default branch to use for live-at-head dependencies',
         default='master'
         )
+    parser.add_argument(
+        '--source-manifest',
+        type=str,
+        help='file caching the source tree scan (relative to path)',
+        default=None
+        )
+    parser.add_argument(
+        '--rescan',
+        action='store_true',
+        help='ignore the source tree manifest and scan the full tree',
+        default=False
+        )
+    parser.add_argument(
+        '--include-graph-cache',
+        type=str,
+        help='file caching the include directives of the sources '
+             '(relative to path)',
+        default=None
+        )
+    parser.add_argument(
+        '--changed-files',
+        type=str,
+        help='file listing changed files (relative to path, "-" for '
+             'stdin); only the affected test directories are added',
+        default=None
+        )
+    parser.add_argument(
+        '--ignore-changes',
+        type=str,
+        nargs='*',
+        help='glob patterns of changed files that affect no test',
+        default=['*.md']
+        )
+    parser.add_argument(
+        '--direct-only',
+        action='store_false',
+        dest='transitive',
+        help='only declare the direct develop dependencies',
+        default=True
+        )
+    parser.add_argument(
+        '--unity-batch-size',
+        type=int,
+        help='compile sources in unity batches of at most this many files',
+        default=None
+        )
+    parser.add_argument(
+        '--unity-exclude',
+        type=str,
+        help='file of glob patterns of sources excluded from unity '
+             'batches (relative to path)',
+        default=os.path.join('cmake', 'unity_exclude.txt')
+        )
+    parser.add_argument(
+        '--precompiled-headers',
+        action='store_true',
+        help='precompile the most widely included headers',
+        default=False
+        )
+    parser.add_argument(
+        '--pch-size-limit',
+        type=int,
+        help='maximum size of the precompiled headers (in kB)',
+        default=1024
+        )
+    parser.add_argument(
+        '--object-library',
+        action='store_true',
+        help='compile sources once in an OBJECT library shared by the '
+             'project target and the tests',
+        default=False
+        )
+    parser.add_argument(
+        '--shared-tests',
+        action='store_true',
+        help='link the tests against a shared variant of the object '
+             'library (implies --object-library)',
+        default=False
+        )
+    parser.add_argument(
+        '--component-libraries',
+        action='store_true',
+        help='compile the sources of every directory under src/<name>/ in '
+             'its own library, linked by the project target and by the '
+             'tests including it',
+        default=False
+        )
+    parser.add_argument(
+        '--time-trace',
+        action='store_true',
+        help='write clang -ftime-trace compilation profiles (see '
+             'analyze_repository.py time-trace)',
+        default=False
+        )
+    parser.add_argument(
+        '--performance-profiles',
+        action='store_true',
+        help='add CMake options for link time optimization, tuning for '
+             'the host processor and profile-guided optimization',
+        default=False
+        )
+    parser.add_argument(
+        '--compiler-cache',
+        action='store_true',
+        help='use ccache or sccache, when found, as the compiler launcher',
+        default=False
+        )
+    parser.add_argument(
+        '--presets',
+        action='store_true',
+        help='also write a CMakePresets.json file with Ninja configure, '
+             'build and test presets',
+        default=False
+        )
+    parser.add_argument(
+        '--preset-jobs',
+        type=positive_integer,
+        help='number of parallel build and test jobs in the presets '
+             '(left to Ninja and CTest by default)',
+        default=None
+        )
+    parser.add_argument(
+        '--test-shards',
+        type=int,
+        help='combine the test directories into about this many '
+             'test executables',
+        default=None
+        )
+    parser.add_argument(
+        '--schedule-tests',
+        action='store_true',
+        help='give the tests the COST, PROCESSORS and RESOURCE_LOCK '
+             'properties from previous CTest runs in the build directory',
+        default=False
+        )
+    parser.add_argument(
+        '--test-processors',
+        type=str,
+        help='file of glob patterns of tests and the number of processors '
+             'they use (relative to path)',
+        default=os.path.join('cmake', 'test_processors.txt')
+        )
+    parser.add_argument(
+        '--test-discovery',
+        type=str,
+        choices=('static', 'catch'),
+        help='add a CTest entry per test case, using the test case names '
+             'found in the test sources or catch_discover_tests',
+        default=None
+        )
+    parser.add_argument(
+        '--test-directories',
+        action='store_true',
+        help='also write the CMakeLists.txt file of every test directory',
+        default=False
+        )
+    parser.add_argument(
+        '--jobs', '-j',
+        type=int,
+        help='number of concurrent git operations on dependencies',
+        default=None
+        )
+    parser.add_argument(
+        '--git-backend',
+        type=str,
+        choices=ReleaseDependencies.backends,
+        help='how release dependencies query their checkouts',
+        default='git'
+        )
+    parser.add_argument(
+        '--no-release-cache',
+        action='store_false',
+        dest='release_cache',
+        help='do not cache release dependencies in the build directory',
+        default=True
+        )
+    parser.add_argument(
+        '--invalidate-cache',
+        action='store_true',
+        help='discard cached release dependencies before resolving',
+        default=False
+        )
+    parser.add_argument(
+        '--mirror-dir',
+        type=str,
+        help='directory of shared Git mirrors for local dependencies',
+        default=os.path.join(
+            os.path.expanduser('~'), '.cache', 'njoy-devtools', 'mirrors')
+        )
+    parser.add_argument(
+        '--archives',
+        action='store_true',
+        help='download pinned dependencies as archives instead of cloning',
+        default=False
+        )
+    parser.add_argument(
+        '--archive-cache',
+        type=str,
+        help='directory in which dependency archives are kept',
+        default=None
+        )
+    parser.add_argument(
+        '--no-mirror-update',
+        action='store_false',
+        dest='update_mirrors',
+        help='use the local mirrors as they are, without fetching',
+        default=True
+        )
 
     # exclusive group
     group = parser.add_mutually_exclusive_group(required=False)
@@ -75,47 +321,394 @@ def process_input():
         dest='release',
         help='Create release_dependencies.cmake file'
         )    
+    group.add_argument(
+        '--local',
+        action='store_true',
+        dest='local',
+        help='Create local_dependencies.cmake file using Git mirrors',
+        default=False
+        )
 
-    # parse and return
+    # parse and check
     args = parser.parse_args()
+
+    args.repositories = [(path, args.name) for path in args.path]
+    if args.workspace:
+        args.repositories += read_workspace(args.workspace)
+
+    if not args.repositories:
+        parser.error('at least one repository path is required')
+    if args.name and len(args.repositories) > 1:
+        parser.error('--name can only be used with a single repository')
+    if args.archive_cache and not args.archives:
+        parser.error('--archive-cache requires --archives')
+    if args.component_libraries and (args.object_library or
+                                     args.shared_tests):
+        parser.error('--component-libraries cannot be used with '
+                     '--object-library or --shared-tests')
+    if args.superbuild and not args.workspace:
+        parser.error('--superbuild requires a workspace manifest')
+    if args.superbuild and args.release:
+        parser.error('--superbuild cannot be used with --release')
+
+    args.path, args.name = args.repositories[0]
     return args
 
 
-def make_build_system(args):
+def read_workspace(filename):
+    """ Read a workspace manifest, returning a list of (path, name)
+    pairs.
+
+    The manifest is a JSON list whose entries are either a path or a
+    dictionary with a "path" and an optional "name".  Relative paths are
+    taken relative to the manifest.
+
+    """
+
+    with open(filename, 'r') as f:
+        entries = json.load(f)
+
+    top = os.path.dirname(os.path.abspath(filename))
+    repositories = []
+    for entry in entries:
+        if isinstance(entry, str):
+            entry = {'path': entry}
+        elif not isinstance(entry, dict) or 'path' not in entry:
+            raise Exception('%r is an invalid workspace entry.' % entry)
+
+        repositories.append((
+            os.path.join(top, entry['path']),
+            entry.get('name', None)
+            ))
+
+    return repositories
+
+
+def make_build_systems(args):
+    """ Make the build system of every repository in args.repositories
+    using a process pool.
+
+    The dependency file is parsed once and handed to every worker.
+    Returns a list of (path, error) pairs, where error is None on
+    success.
+
+    """
+
+    registry = None
+    if not args.release:
+        registry = read_dependencies(args.dependencies)
+
+    # update the shared mirrors once, rather than in every worker
+    if args.local and args.update_mirrors:
+        update_mirrors(args, registry)
+        args = copy.copy(args)
+        args.update_mirrors = False
+
+    jobs = []
+    for path, name in args.repositories:
+        repo_args = copy.copy(args)
+        repo_args.path = path
+        repo_args.name = name
+        jobs.append(repo_args)
+
+    with ProcessPoolExecutor(
+            max_workers=args.processes,
+            initializer=_init_worker,
+            initargs=(registry,)
+            ) as executor:
+        errors = list(executor.map(_run_worker, jobs))
+
+    return [(job.path, error) for job, error in zip(jobs, errors)]
+
+
+def make_superbuild(args):
+    """ Write the superbuild of the repositories in the workspace
+    manifest, next to the manifest.
+
+    """
+
+    workspace = Workspace(
+        os.path.dirname(os.path.abspath(args.workspace)),
+        [build.BuildSystem(path, name) for path, name in args.repositories],
+        read_dependencies(args.dependencies)
+        )
+    for conflict in workspace.conflicts():
+        print(
+            'Warning: {0} is {2} in {1} but {4} in {3}; '
+            'using the former.'.format(*conflict)
+            )
+    workspace.write_cmakelists()
+
+
+def report(results):
+    """ Print a per-repository summary of a batch run.  Returns True if
+    all repositories succeeded.
+
+    """
+
+    print('\nSummary')
+    print('-------')
+    for path, error in results:
+        if error is None:
+            print('  ok      {}'.format(path))
+        else:
+            print('  FAILED  {}: {}'.format(path, error))
+
+    failed = sum(1 for _, error in results if error is not None)
+    print('{} succeeded, {} failed'.format(len(results) - failed, failed))
+
+    return failed == 0
+
+
+def update_mirrors(args, registry):
+    """ Clone or update the local mirrors of every remote in the
+    dependency registry.
+
+    """
+
+    graph = DependencyGraph(registry)
+    remotes = [
+        dependency.remote
+        for component in registry
+        for dependency in graph.direct(component)
+        ]
+
+    mirrors = MirrorCache(args.mirror_dir, workers=args.jobs)
+    for remote, error in mirrors.update(remotes):
+        if error:
+            print('Warning: could not update mirror of {}: {}'
+                  ''.format(remote, error))
+
+
+def read_patterns(filename):
+    """ Read a list of glob patterns, one per line, ignoring blank
+    lines and comments.  A missing file gives an empty list.
+
+    """
+
+    if not os.path.isfile(filename):
+        return []
+
+    with open(filename, 'r') as f:
+        lines = [line.split('#')[0].strip() for line in f]
+
+    return [line for line in lines if line]
+
+
+def positive_integer(value):
+    """ Parse a command line argument that must be a positive integer.
+
+    """
+
+    try:
+        result = int(value)
+    except ValueError:
+        result = 0
+    if result < 1:
+        raise argparse.ArgumentTypeError(
+            '{} is not a positive integer'.format(value))
+
+    return result
+
+
+def read_processors(filename):
+    """ Read a list of (glob pattern, number of processors) pairs, one
+    per line, ignoring blank lines and comments.  A missing file gives an
+    empty list.
+
+    """
+
+    processors = []
+    for line in read_patterns(filename):
+        fields = line.split()
+        if len(fields) != 2 or not fields[1].isdigit():
+            raise Exception('%r is an invalid test processors line.' % line)
+        processors.append((fields[0], int(fields[1])))
+
+    return processors
+
+
+def read_dependencies(filename):
+    """ Parse the dependency registry.
+
+    """
+
+    with open(filename, 'r') as f:
+        return json.load(f)
+
+
+def copy_fetch_options(dependencies, registry):
+    """ Copy the partial clone and sparse checkout options of the
+    dependency registry to the dependencies of the same name.
+
+    """
+
+    options = {}
+    for entries in registry.values():
+        for item in entries or ():
+            if isinstance(item, dict):
+                dependency = Dependency(**item)
+                if dependency.partial_fetch:
+                    options.setdefault(dependency.name.lower(), dependency)
+
+    for dependency in dependencies:
+        specified = options.get(dependency.name.lower())
+        if specified:
+            dependency.partial_clone = specified.partial_clone
+            dependency.sparse = list(specified.sparse)
+
+
+def make_build_system(args, registry=None):
 
     Dependency.default_branch = args.default_branch
 
+    manifest = None
+    if args.source_manifest:
+        manifest = os.path.join(args.path, args.source_manifest)
+
     b = build.BuildSystem(
         args.path,
-        args.name
+        args.name,
+        manifest=manifest,
+        rescan=args.rescan
         ) 
 
+    b.unity_batch_size = args.unity_batch_size
+    b.unity_exclude = read_patterns(
+        os.path.join(args.path, args.unity_exclude))
+    b.precompiled_headers = args.precompiled_headers
+    b.pch_size_limit = args.pch_size_limit * 1024
+    b.test_shards = args.test_shards
+    b.time_trace = args.time_trace
+    b.performance_profiles = args.performance_profiles
+    b.compiler_cache = args.compiler_cache
+    b.preset_jobs = args.preset_jobs
+    b.object_library = args.object_library or args.shared_tests
+    b.shared_tests = args.shared_tests
+    b.component_libraries = args.component_libraries
+    b.test_discovery = args.test_discovery
+    if args.include_graph_cache:
+        b.include_graph_cache = os.path.join(
+            args.path, args.include_graph_cache)
+
+    if args.schedule_tests:
+        # Test costs are taken from the previous CTest runs in the build
+        # folder, if any
+        b.test_scheduling = True
+        b.test_costs = TestHistory(
+            os.path.join(args.path, args.build_dir)).costs
+        b.test_processors = read_processors(
+            os.path.join(args.path, args.test_processors))
+
     if args.release:
         # Release dependencies are taken from examining the
-        # build/_deps folder
+        # build/_deps folder, caching the result in the build folder
+
+        build_dir = os.path.join(args.path, args.build_dir)
+        cache = None
+        if args.release_cache:
+            cache = os.path.join(build_dir, 'release_dependencies.json')
 
         b.dependencies = ReleaseDependencies(
-            os.path.join(
-                args.path,
-                args.build_dir,
-                '_deps'
-                )
+            os.path.join(build_dir, '_deps'),
+            workers=args.jobs,
+            backend=args.git_backend,
+            cache=cache,
+            invalidate=args.invalidate_cache
             )
 
+        # dependencies keep being cloned partially or sparsely, as
+        # specified in the dependency file
+        if registry is None and os.path.isfile(args.dependencies):
+            registry = read_dependencies(args.dependencies)
+        if registry:
+            copy_fetch_options(b.dependencies, registry)
+
     else:
         # Develop dependencies are given in an input JSON file
 
-        with open(args.dependencies, 'r') as f:
-            dependencies = json.load(f)
+        if registry is None:
+            registry = read_dependencies(args.dependencies)
+
+        if args.transitive:
+            # flatten the dependency graph so that every repository is
+            # declared (and fetched) once, by the top-level project
+            graph = DependencyGraph(registry)
+            for conflict in graph.conflicts(b.name):
+                print(
+                    'Warning: {0} is {2} in {1} but {4} in {3}; '
+                    'using the former.'.format(*conflict)
+                    )
+            b.dependencies = graph.resolve(b.name)
+
+        else:
+            deps = registry[b.name]
+            if deps:
+                b.dependencies = deps
+
+        if args.local:
+            # Local dependencies are fetched from the mirror cache
+            # rather than from the remotes
+
+            if args.update_mirrors:
+                update_mirrors(args, registry)
+
+            b.dependencies = LocalDependencies(
+                b.dependencies,
+                MirrorCache(args.mirror_dir)
+                )
+
+    if args.archives and b.dependencies:
+        # Pinned dependencies are downloaded as archives, with their
+        # hashes recorded next to the dependency files
 
-        deps = dependencies[b.name]
-        if deps:
-            b.dependencies = deps
+        os.makedirs(os.path.join(args.path, 'cmake'), exist_ok=True)
+        resolver = ArchiveResolver(
+            os.path.join(args.path, 'cmake', 'archive_hashes.json'),
+            cache=args.archive_cache,
+            workers=args.jobs
+            )
+        resolver.apply(b.dependencies)
 
     b.write_dependencies()
     if not args.release:
         b.write_cmakelists()
-        b.write_test_list()
+        if args.presets:
+            b.write_presets()
+        if args.changed_files:
+            b.write_test_list(b.affected_test_directories(
+                read_changed_files(args.changed_files),
+                args.ignore_changes
+                ))
+        else:
+            b.write_test_list()
+        if args.test_directories:
+            b.write_test_directories()
+
+
+
+###################################################################
+# Process pool workers
+###################################################################
+
+_registry = None
+
+
+def _init_worker(registry):
+
+    global _registry
+    _registry = registry
+
+
+def _run_worker(args):
+
+    try:
+        make_build_system(args, _registry)
+    except Exception as e:
+        traceback.print_exc()
+        return '{}: {}'.format(type(e).__name__, e)
+
+    return None
 
 
 if __name__ == '__main__':